@@ -0,0 +1,128 @@
+"""Compares the rows/sec of the ways DataFrames have been loaded into
+postgres: per-row dicts through `session.bulk_insert_mappings` (formerly
+`Tables.bulk_insert`), `DataFrame.to_sql` (formerly `save_predictions`)
+and COPY (`oagdedupe.db.postgres.bulk.copy_from`).
+
+Loads synthetic attribute rows (as in `df`) and scores (as in `scores`)
+into scratch tables of the project schema, e.g.
+
+    python benchmarks/bulk_load.py --settings='.dedupe/.env' --n=1000000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from faker import Faker
+from sqlalchemy import Column, Float, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+from oagdedupe.db.postgres.bulk import copy_from
+from oagdedupe.db.postgres.tables import Tables
+from oagdedupe.settings import Settings
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--settings", help="set settings file location")
+parser.add_argument("--n", type=int, default=200_000, help="rows to load")
+args = parser.parse_args()
+
+if args.settings:
+    settings = Settings(args.settings)
+else:
+    settings = Settings()
+
+tables = Tables(settings=settings)
+tables.create_schema()
+engine = tables.engine
+schema = settings.db.db_schema
+Base = declarative_base()
+
+
+class BenchDf(Base):
+    __tablename__ = "bench_df"
+    __table_args__ = {"schema": schema}
+    _index = Column(Integer, primary_key=True)
+    name = Column(String)
+    addr = Column(String)
+
+
+class BenchScores(Base):
+    __tablename__ = "bench_scores"
+    __table_args__ = {"schema": schema}
+    _index_l = Column(Integer, primary_key=True)
+    _index_r = Column(Integer, primary_key=True)
+    score = Column(Float)
+
+
+fake = Faker()
+fake.seed_instance(0)
+names = [fake.name() for _ in range(1000)]
+addrs = [fake.address() for _ in range(1000)]
+rng = np.random.default_rng(0)
+frames = {
+    BenchDf: pd.DataFrame(
+        {
+            "name": rng.choice(names, args.n),
+            "addr": rng.choice(addrs, args.n),
+        }
+    ),
+    BenchScores: pd.DataFrame(
+        {
+            "_index_l": np.arange(args.n) // 10,
+            "_index_r": np.arange(args.n),
+            "score": rng.random(args.n),
+        }
+    ),
+}
+
+
+def bulk_insert_mappings(table, df):
+    with sessionmaker(bind=engine)() as session:
+        session.bulk_insert_mappings(table, df.to_dict(orient="records"))
+        session.commit()
+
+
+def to_sql(table, df):
+    df.to_sql(
+        table.__tablename__,
+        schema=schema,
+        con=engine,
+        if_exists="append",
+        index=False,
+    )
+
+
+def copy(table, df):
+    copy_from(
+        engine,
+        df,
+        table=table.__tablename__,
+        schema=schema,
+        chunksize=settings.db.chunksize,
+    )
+
+
+results = []
+for table, df in frames.items():
+    for method in [bulk_insert_mappings, to_sql, copy]:
+        table.__table__.drop(engine, checkfirst=True)
+        table.__table__.create(engine)
+        start = time.perf_counter()
+        method(table, df)
+        elapsed = time.perf_counter() - start
+        results.append(
+            {
+                "table": table.__tablename__,
+                "method": method.__name__,
+                "rows/sec": round(len(df) / elapsed),
+            }
+        )
+    table.__table__.drop(engine)
+
+print(
+    pd.DataFrame(results).pivot(
+        index="method", columns="table", values="rows/sec"
+    )
+)
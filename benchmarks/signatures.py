@@ -0,0 +1,66 @@
+"""Compares the "udf" and "pandas" signature engines when building forward
+indices on `train` (blocks_train) and `df` (blocks_df).
+
+Run against a project that has already been initialized, e.g.
+
+    python benchmarks/signatures.py --settings='.dedupe/.env'
+"""
+
+import argparse
+import time
+
+import pandas as pd
+
+from oagdedupe.db.postgres.repository import PostgresRepository
+from oagdedupe.settings import Settings
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--settings", help="set settings file location")
+args = parser.parse_args()
+
+if args.settings:
+    settings = Settings(args.settings)
+else:
+    settings = Settings()
+
+
+def timed(f, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    f(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+results, forward, forward_full = [], {}, {}
+for engine in ["udf", "pandas"]:
+    _settings = settings.copy(deep=True)
+    _settings.db.signature_engine = engine
+    repo = PostgresRepository(settings=_settings)
+
+    train = timed(repo.blocking.build_forward_indices, full=False)
+    forward[engine] = repo.blocking.query(
+        f"SELECT * FROM {_settings.db.db_schema}.blocks_train ORDER BY _index"
+    )
+
+    repo._init_forward_index_full()
+    full = timed(
+        repo.blocking.build_forward_indices,
+        full=True,
+        conjunction=tuple(repo.blocking.block_scheme_names),
+    )
+    forward_full[engine] = repo.blocking.query(
+        f"SELECT * FROM {_settings.db.db_schema}.blocks_df ORDER BY _index"
+    )
+    results.append(
+        {"engine": engine, "blocks_train (s)": train, "blocks_df (s)": full}
+    )
+
+print(pd.DataFrame(results).set_index("engine").round(2))
+pd.testing.assert_frame_equal(
+    forward["udf"], forward["pandas"], check_dtype=False
+)
+pd.testing.assert_frame_equal(
+    forward_full["udf"].sort_index(axis=1),
+    forward_full["pandas"].sort_index(axis=1),
+    check_dtype=False,
+)
+print("blocks_train and blocks_df are identical for both engines")
@@ -16,6 +16,41 @@ class Dists(BaseModel):
     dists: List[List[float]]
 
 
+# binary transport for /predict: a little-endian float32 buffer, preceded
+# by its shape as two little-endian uint32
+ARRAY_MEDIA_TYPE = "application/x-float32-array"
+
+
+def array_to_bytes(arr: np.ndarray) -> bytes:
+    """encodes a 2d array for ARRAY_MEDIA_TYPE"""
+    arr = np.ascontiguousarray(arr, dtype="<f4")
+    return np.array(arr.shape, dtype="<u4").tobytes() + arr.tobytes()
+
+
+def array_from_bytes(buf: bytes, n_cols: Optional[int] = None) -> np.ndarray:
+    """
+    decodes a 2d array sent as ARRAY_MEDIA_TYPE, without copying; raises
+    ValueError if the buffer does not match its shape header, or if the
+    array does not have n_cols columns
+    """
+    if len(buf) < 8:
+        raise ValueError("array buffer is missing its shape header")
+    rows, cols = (int(x) for x in np.frombuffer(buf, dtype="<u4", count=2))
+    if len(buf) != 8 + 4 * rows * cols:
+        raise ValueError(
+            f"array buffer of {len(buf)} bytes does not hold {rows}x{cols} "
+            "float32 values"
+        )
+    if n_cols is not None and cols != n_cols:
+        raise ValueError(f"expected {n_cols} columns, got {cols}")
+    return np.frombuffer(buf, dtype="<f4", offset=8).reshape(rows, cols)
+
+
+def media_type(content_type: Optional[str]) -> str:
+    """media type of a content-type header, without its parameters"""
+    return (content_type or "").split(";")[0].strip().lower()
+
+
 # LSAPI
 class Annotation(BaseModel):
     id: int
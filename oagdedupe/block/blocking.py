@@ -1,5 +1,7 @@
 import logging
 from dataclasses import dataclass
+from itertools import takewhile
+from typing import Tuple
 
 from oagdedupe._typing import ENGINE, StatsDict
 from oagdedupe.base import BaseBlocking
@@ -40,6 +42,51 @@ class Blocking(BaseBlocking):
         """
         return stats.rr < self.forward.repo.min_rr
 
+    def _exceeds_max_compare(self, stats: StatsDict) -> bool:
+        """
+        check if a conjunction generates more pairs on full data than the
+        maximum number of comparisons
+
+        Only conjunctions of a single scheme with one signature per entity
+        are skipped, as their histogram estimate is exact; for the others
+        the estimate, an approximation, is only logged and they are
+        bounded by the comparison budget of add_new_comparisons().
+        """
+        estimate = self.repo.estimate_stats(
+            conjunction=stats.conjunction, table="blocks_df"
+        )
+        if estimate.n_pairs <= self.settings.model.max_compare:
+            return False
+        schemes = set(stats.conjunction)
+        if len(schemes) > 1 or any("ngrams" in s for s in schemes):
+            logging.info(
+                "conjunction %s estimated at about %d pairs; "
+                "bounded by the comparison budget",
+                stats.conjunction,
+                estimate.n_pairs,
+            )
+            return False
+        logging.warning(
+            "skipping conjunction %s: %d pairs expected",
+            stats.conjunction,
+            estimate.n_pairs,
+        )
+        return True
+
+    @property
+    def conjunction_schemes(self) -> Tuple[str]:
+        """
+        block schemes used by the conjunctions that pass the reduction
+        ratio check, in order of first use
+        """
+        passing = takewhile(
+            lambda stats: not self._check_rr(stats),
+            self.conj.conjunctions_list,
+        )
+        return tuple(
+            dict.fromkeys(s for stats in passing for s in stats.conjunction)
+        )
+
     def save_comparisons(self, table: str, n_covered: int) -> None:
         """
         Iterates through best conjunction from best to worst.
@@ -49,7 +96,14 @@ class Blocking(BaseBlocking):
 
         Stop if (a) subsequent conjunction yields a reduction ratio
         below the minimum rr setting or (b) the number of comparison
-        pairs gathered exceeds n_covered.
+        pairs gathered reaches n_covered (or SettingsModel.max_compare);
+        the last conjunction is then only partially added, see
+        BaseRepositoryBlocking.add_new_comparisons().
+
+        For full data, forward indices are built per conjunction as
+        needed, or all at once if SettingsModel.single_scan is set, and
+        single-scheme conjunctions known to exceed SettingsModel.max_compare
+        pairs are skipped.
 
         Parameters
         ----------
@@ -59,8 +113,17 @@ class Blocking(BaseBlocking):
         n_covered: int
             number of records that the conjunctions should cover
         """
+        single_scan = table == "blocks_df" and self.settings.model.single_scan
+        if single_scan:
+            self.forward.build_forward_indices(
+                full=True, conjunction=self.conjunction_schemes
+            )
+
         stepsize = n_covered // 10
         step = 0
+        # running total, so that the stopping rule costs no query per step
+        n_pairs = self.repo.get_n_pairs(table=table)
+        limit = min(n_covered, self.settings.model.max_compare)
         for i, stats in enumerate(self.conj.conjunctions_list):
             if self._check_rr(stats):
                 logging.warning(
@@ -71,15 +134,19 @@ class Blocking(BaseBlocking):
                 )
                 return
             if table == "blocks_df":
-                self.forward.build_forward_indices(
-                    full=True, conjunction=stats.conjunction
-                )
-            self.pairs.add_new_comparisons(stats=stats, table=table)
-            n_pairs = self.repo.get_n_pairs(table=table)
+                if not single_scan:
+                    self.forward.build_forward_indices(
+                        full=True, conjunction=stats.conjunction
+                    )
+                if self._exceeds_max_compare(stats):
+                    continue
+            n_pairs += self.pairs.add_new_comparisons(
+                stats=stats, table=table, budget=limit - n_pairs
+            )
             if n_pairs // stepsize > step:
                 logging.info(f"""{n_pairs} comparison pairs gathered""")
                 step = n_pairs // stepsize
-            if n_pairs > n_covered:
+            if n_pairs >= limit:
                 return
 
     def save(self, full: bool = False):
@@ -95,4 +162,7 @@ class Blocking(BaseBlocking):
             )
         else:
             self.forward.build_forward_indices(full=False)
+            # sample and labels may have changed since conjunctions were
+            # last learned
+            self.conj.__dict__.pop("conjunctions_list", None)
             self.save_comparisons(table="blocks_train", n_covered=500)
@@ -0,0 +1,134 @@
+"""This module contains a conjunction stats cache shared by the pool
+workers that learn conjunctions.
+"""
+
+import logging
+from dataclasses import dataclass
+from multiprocessing.managers import SyncManager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from oagdedupe._typing import StatsDict
+
+# placeholder for a conjunction that a worker is currently computing
+PENDING = "pending"
+
+
+@dataclass
+class StatsCache:
+    """
+    Conjunction stats held by a multiprocessing manager, so that each
+    conjunction is computed once per sample no matter how many workers
+    ask for it.
+
+    The first worker to ask for a conjunction claims it and computes its
+    stats; workers that ask while it is pending wait on a condition
+    until the result is stored or the claim is released, or, if a timeout
+    is set, compute the stats themselves once it expires.
+
+    Attributes
+    ----------
+    stats: Dict[Tuple[str], Any]
+        StatsDict, or PENDING, for each conjunction; a manager dict proxy
+    counts: Dict[str, int]
+        number of hits and misses; a manager dict proxy
+    condition: Any
+        manager condition guarding stats and counts, notified whenever a
+        claim is resolved
+    timeout: Optional[float]
+        seconds to wait for a pending conjunction, see
+        SettingsModel.stats_wait_timeout; None waits until it is resolved
+    """
+
+    stats: Dict[Tuple[str], Any]
+    counts: Dict[str, int]
+    condition: Any
+    timeout: Optional[float] = None
+
+    @classmethod
+    def create(
+        cls, manager: SyncManager, timeout: Optional[float] = None
+    ) -> "StatsCache":
+        return cls(
+            stats=manager.dict(),
+            counts=manager.dict(hits=0, misses=0),
+            condition=manager.Condition(),
+            timeout=timeout,
+        )
+
+    def get(
+        self, conjunction: Tuple[str], compute: Callable[[], StatsDict]
+    ) -> StatsDict:
+        """
+        Gets the stats of a conjunction, computing them with `compute` if
+        no worker has claimed it yet.
+
+        Parameters
+        ----------
+        conjunction: Tuple[str]
+            tuple of block schemes
+        compute: Callable[[], StatsDict]
+            computes the stats on a miss
+
+        Returns
+        ----------
+        StatsDict
+        """
+        with self.condition:
+            res = self.stats.get(conjunction)
+            if res is None:
+                self.stats[conjunction] = PENDING
+                self.counts["misses"] += 1
+            else:
+                self.counts["hits"] += 1
+                if res == PENDING:
+                    self.condition.wait_for(
+                        lambda: self.stats.get(conjunction) != PENDING,
+                        timeout=self.timeout,
+                    )
+                    res = self.stats.get(conjunction)
+                    if res is None:
+                        # the claiming worker failed; claim it again
+                        self.stats[conjunction] = PENDING
+
+        if res is None:
+            return self._claim(conjunction, compute)
+        if res == PENDING:
+            logging.warning(
+                "conjunction %s still pending after %s seconds; "
+                "computing it here",
+                conjunction,
+                self.timeout,
+            )
+            return compute()
+        return res
+
+    def _claim(
+        self, conjunction: Tuple[str], compute: Callable[[], StatsDict]
+    ) -> StatsDict:
+        """
+        computes the stats of a claimed conjunction; the claim is released
+        for waiting workers to retry if compute raises
+        """
+        res = None
+        try:
+            res = compute()
+            return res
+        finally:
+            with self.condition:
+                if res is None:
+                    del self.stats[conjunction]
+                else:
+                    self.stats[conjunction] = res
+                self.condition.notify_all()
+
+    def update(self, stats: List[StatsDict]) -> None:
+        """adds stats computed elsewhere, e.g. persisted by an earlier run"""
+        self.stats.update({x.conjunction: x for x in stats})
+
+    def values(self) -> List[StatsDict]:
+        """stats of every conjunction computed so far"""
+        return [x for x in self.stats.values() if isinstance(x, StatsDict)]
+
+    def info(self) -> Dict[str, int]:
+        """number of hits and misses"""
+        return dict(self.counts)
@@ -2,15 +2,17 @@
 block scheme conjunctions and uses these to generate comparison pairs.
 """
 
-from dataclasses import dataclass
+import logging
+from dataclasses import dataclass, field
 from functools import cached_property
-from multiprocessing import Pool
-from typing import List
+from multiprocessing import Manager, Pool
+from typing import Dict, List
 
 import tqdm
 
 from oagdedupe._typing import ENGINE, StatsDict
 from oagdedupe.block.base import BaseConjunctions, BaseOptimizer
+from oagdedupe.block.cache import StatsCache
 from oagdedupe.block.schemes import BlockSchemes
 from oagdedupe.settings import Settings
 
@@ -25,27 +27,54 @@ class Conjunctions(BaseConjunctions, BlockSchemes):
     ----------
     optimizer: BaseOptimizer
     settings: Settings
+    cache_info: Dict[str, int]
+        hits and misses of the shared stats cache in the last run
     """
 
     optimizer: BaseOptimizer
     settings: Settings
+    cache_info: Dict[str, int] = field(default_factory=dict, init=False)
 
     @property
     def _conjunctions(self) -> List[List[StatsDict]]:
         """
-        Computes conjunctions for each block scheme in parallel
+        Computes conjunctions for each block scheme in parallel; the
+        workers share a stats cache so that each conjunction is scored
+        once.
+
+        The cache starts from the stats persisted for the current train
+        sample, if any, and is persisted again once learning is done.
 
         Returns
         ----------
         List[List[StatsDict]]
         """
-        with Pool(self.settings.model.cpus) as p:
-            res = list(
-                tqdm.tqdm(
-                    p.imap(self.optimizer.get_best, self.block_scheme_tuples),
-                    total=len(self.block_scheme_tuples),
-                )
+        with Manager() as manager:
+            self.optimizer.cache = StatsCache.create(
+                manager, timeout=self.settings.model.stats_wait_timeout
+            )
+            self.optimizer.cache.update(
+                self.optimizer.repo.get_persisted_stats()
             )
+            try:
+                with Pool(self.settings.model.cpus) as p:
+                    res = list(
+                        tqdm.tqdm(
+                            p.imap(
+                                self.optimizer.get_best,
+                                self.block_scheme_tuples,
+                            ),
+                            total=len(self.block_scheme_tuples),
+                        )
+                    )
+                self.cache_info = self.optimizer.cache.info()
+                self.optimizer.repo.persist_stats(self.optimizer.cache.values())
+            finally:
+                self.optimizer.cache = None
+        logging.info(
+            "conjunction stats cache: %(hits)d hits, %(misses)d misses",
+            self.cache_info,
+        )
         return res
 
     @cached_property
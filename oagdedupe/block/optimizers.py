@@ -8,6 +8,7 @@ from typing import List, Optional, Tuple
 
 from oagdedupe._typing import StatsDict
 from oagdedupe.block.base import BaseOptimizer
+from oagdedupe.block.cache import StatsCache
 from oagdedupe.block.schemes import BlockSchemes
 from oagdedupe.db.base import BaseRepositoryBlocking
 from oagdedupe.settings import Settings
@@ -23,10 +24,13 @@ class DynamicProgram(BaseOptimizer, BlockSchemes):
     ----------
     repo: BaseRepositoryBlocking
     settings: Settings
+    cache: Optional[StatsCache]
+        conjunction stats shared across pool workers, if any
     """
 
     repo: BaseRepositoryBlocking
     settings: Settings
+    cache: Optional[StatsCache] = None
 
     def __eq__(self, other):
         return self is other
@@ -38,13 +42,21 @@ class DynamicProgram(BaseOptimizer, BlockSchemes):
     def score(self, conjunction: Tuple[str]) -> StatsDict:
         """
         Wraps get_conjunction_stats() function with @lru_cache decorator
-        for caching.
+        for caching; misses go to the shared cache, if any, so that
+        other workers reuse the result.
 
         Parameters
         ----------
         conjunction: tuple
             tuple of block schemes
         """
+        if self.cache is None:
+            return self._get_stats(conjunction)
+        return self.cache.get(
+            conjunction, compute=lambda: self._get_stats(conjunction)
+        )
+
+    def _get_stats(self, conjunction: Tuple[str]) -> StatsDict:
         return self.repo.get_conjunction_stats(
             conjunction=conjunction, table="blocks_train"
         )
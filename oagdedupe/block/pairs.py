@@ -5,6 +5,7 @@ This module is only used by oagdedupe.block.learner
 """
 
 from dataclasses import dataclass
+from typing import Optional
 
 from oagdedupe._typing import ENGINE, StatsDict
 from oagdedupe.block.base import BasePairs
@@ -27,7 +28,9 @@ class Pairs(BasePairs):
     repo: BaseRepositoryBlocking
     settings: Settings
 
-    def add_new_comparisons(self, stats: StatsDict, table: str) -> int:
+    def add_new_comparisons(
+        self, stats: StatsDict, table: str, budget: Optional[int] = None
+    ) -> int:
         """
         Computes pairs for conjunction and appends to comparisons or
         full_comparisons table.
@@ -43,12 +46,14 @@ class Pairs(BasePairs):
         table: str
             table used to get pairs (either blocks_train for sample or
             blocks_df for full df)
+        budget: Optional[int]
+            number of new pairs after which to stop; all pairs if None
 
         Returns
         ----------
         int
-            total number of pairs gathered so far
+            number of new pairs inserted
         """
-        self.repo.add_new_comparisons(
-            conjunction=stats.conjunction, table=table
+        return self.repo.add_new_comparisons(
+            conjunction=stats.conjunction, table=table, budget=budget
         )
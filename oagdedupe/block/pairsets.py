@@ -0,0 +1,136 @@
+"""This module contains in-memory pair sets used to compute block scheme
+conjunction stats without a database round trip per conjunction.
+
+Each pair of entities is encoded as a single int64 key, so the pairs
+covered by a block scheme are a sorted array of keys and the pairs covered
+by a conjunction are the intersection of those arrays.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def pair_keys(index_l: np.ndarray, index_r: np.ndarray) -> np.ndarray:
+    """
+    encodes (_index_l, _index_r) pairs as int64 keys: index_l << 32 |
+    index_r, with index_r taken as an unsigned 32-bit integer so that
+    negative indices are safe; same as the pair_key() function in postgres
+    """
+    return (np.asarray(index_l, dtype=np.int64) << 32) | (
+        np.asarray(index_r, dtype=np.int64) & 0xFFFFFFFF
+    )
+
+
+def isin_sorted(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """element-wise membership of a in the sorted array b"""
+    if len(b) == 0:
+        return np.zeros(len(a), dtype=bool)
+    idx = np.searchsorted(b, a)
+    idx[idx == len(b)] = 0
+    return b[idx] == a
+
+
+def _stack(blocks: List[List[int]], idx: np.ndarray) -> np.ndarray:
+    return np.array([blocks[i] for i in idx], dtype=np.int64)
+
+
+def block_pairs(
+    blocks: List[List[int]], blocks_link: Optional[List[List[int]]] = None
+) -> np.ndarray:
+    """
+    Gets all pairs of entities that share a block.
+
+    Blocks of the same size are stacked into a matrix so that the pairs of
+    all of them are generated at once.
+
+    Parameters
+    ----------
+    blocks: List[List[int]]
+        sorted entity indices of each block
+    blocks_link: Optional[List[List[int]]]
+        for record linkage, entity indices of the matching block in df_link;
+        pairs are then the product of each block with its link
+
+    Returns
+    ----------
+    np.ndarray
+        sorted, unique pair keys
+    """
+    keys = [np.empty(0, dtype=np.int64)]
+    sizes = np.array([len(b) for b in blocks])
+    if blocks_link is None:
+        for size in np.unique(sizes[sizes > 1]):
+            m = _stack(blocks, np.flatnonzero(sizes == size))
+            left, right = np.triu_indices(size, 1)
+            keys.append(pair_keys(m[:, left].ravel(), m[:, right].ravel()))
+    else:
+        sizes_link = np.array([len(b) for b in blocks_link])
+        for size, size_link in set(zip(sizes, sizes_link)):
+            idx = np.flatnonzero((sizes == size) & (sizes_link == size_link))
+            m, m_link = _stack(blocks, idx), _stack(blocks_link, idx)
+            keys.append(
+                pair_keys(
+                    np.repeat(m, size_link, axis=1).ravel(),
+                    np.tile(m_link, (1, size)).ravel(),
+                )
+            )
+    return np.unique(np.concatenate(keys))
+
+
+@dataclass
+class PairSets:
+    """
+    Pair sets of each block scheme on the train sample, with the labelled
+    pairs that each of them covers.
+
+    Attributes
+    ----------
+    keys: Dict[str, np.ndarray]
+        sorted pair keys of each block scheme
+    labels: pd.DataFrame
+        labels table: _index_l, _index_r and label, and optionally
+        _pair_key
+    """
+
+    keys: Dict[str, np.ndarray]
+    labels: pd.DataFrame
+
+    def __post_init__(self):
+        if "_pair_key" in self.labels:
+            label_keys = self.labels["_pair_key"].values
+        else:
+            label_keys = pair_keys(
+                self.labels["_index_l"].values, self.labels["_index_r"].values
+            )
+        self.positive = (self.labels["label"] == 1).values
+        self.negative = (self.labels["label"] == 0).values
+        self.covers = {
+            scheme: isin_sorted(label_keys, keys)
+            for scheme, keys in self.keys.items()
+        }
+
+    def intersect(self, conjunction: Tuple[str]) -> np.ndarray:
+        """
+        pairs covered by every scheme of the conjunction, starting from the
+        smallest pair set
+        """
+        sets = sorted((self.keys[s] for s in conjunction), key=len)
+        res = sets[0]
+        for keys in sets[1:]:
+            res = res[isin_sorted(res, keys)]
+        return res
+
+    def stats(self, conjunction: Tuple[str]) -> Tuple[int, int, int]:
+        """
+        number of pairs, positive coverage and negative coverage of a
+        conjunction
+        """
+        covered = np.logical_and.reduce([self.covers[s] for s in conjunction])
+        return (
+            len(self.intersect(conjunction)),
+            int((covered & self.positive).sum()),
+            int((covered & self.negative).sum()),
+        )
@@ -30,6 +30,29 @@ class BlockSchemes:
                         ] = f"{scheme}({attribute})"
         return mapping
 
+    @property
+    def block_scheme_params(self) -> Dict[str, Tuple[str, str, Optional[int]]]:
+        """
+        helper to map column names to (scheme, attribute, parameter)
+        """
+        params = {}
+        for attribute in self.settings.attributes:
+            for scheme, nlist in self.block_schemes:
+                for n in nlist:
+                    if n:
+                        params[f"{scheme}_{n}_{attribute}"] = (
+                            scheme,
+                            attribute,
+                            n,
+                        )
+                    else:
+                        params[f"{scheme}_{attribute}"] = (
+                            scheme,
+                            attribute,
+                            None,
+                        )
+        return params
+
     @property
     def block_scheme_sql(self) -> List[str]:
         """
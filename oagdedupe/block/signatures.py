@@ -0,0 +1,143 @@
+"""This module contains vectorized, in-process implementations of the
+block schemes listed in oagdedupe.block.schemes.
+
+Each function mirrors the postgres function of the same name (see
+oagdedupe.db.postgres.funcs) but computes signatures for a whole column
+at once instead of being called once per row.
+"""
+
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from oagdedupe.block.schemes import BlockSchemes
+from oagdedupe.settings import Settings
+
+
+def first_nchars(s: pd.Series, n: int) -> pd.Series:
+    """first n characters of each value"""
+    return s.str[:n]
+
+
+def last_nchars(s: pd.Series, n: int) -> pd.Series:
+    """last n characters of each value"""
+    return s.str[-n:]
+
+
+def find_ngrams(s: pd.Series, n: int) -> pd.Series:
+    """
+    all contiguous n-grams of each value, in order of appearance
+
+    Values are grouped into buckets of similar length (up to a power of
+    two) and each bucket is laid out as a fixed-width array of code points,
+    so that every n-gram window is sliced out in one vectorized operation
+    without padding short values to the longest one. Valid windows are
+    gathered into one flat array, which is split into per-value lists at
+    the value offsets.
+
+    Parameters
+    ----------
+    s: pd.Series
+        column of strings
+    n: int
+        n-gram size
+
+    Returns
+    ----------
+    pd.Series
+        lists of n-grams; null values stay null
+    """
+    isnull = s.isnull().to_numpy()
+    values = s.fillna("").astype(str)
+    lengths = values.str.len().to_numpy()
+    counts = np.clip(lengths - n + 1, 0, None)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    flat = np.empty(offsets[-1], dtype=f"<U{n}")
+    buckets = np.ceil(np.log2(np.maximum(counts, 1))).astype(int)
+    for bucket in np.unique(buckets[counts > 0]):
+        rows = np.flatnonzero((buckets == bucket) & (counts > 0))
+        width = int(counts[rows].max())
+        codes = (
+            values.iloc[rows]
+            .to_numpy(dtype=f"<U{width + n - 1}")
+            .view(np.uint32)
+            .reshape(len(rows), -1)
+        )
+        grams = (
+            np.ascontiguousarray(
+                np.lib.stride_tricks.sliding_window_view(codes, n, axis=1)
+            )
+            .view(f"<U{n}")
+            .reshape(len(rows), -1)
+        )
+        valid = np.arange(width) < counts[rows, None]
+        positions = offsets[rows, None] + np.arange(width)
+        flat[positions[valid]] = grams[valid]
+
+    bounds = offsets.tolist()
+    out = np.empty(len(s), dtype=object)
+    out[:] = [flat[i:j].tolist() for i, j in zip(bounds, bounds[1:])]
+    out[isnull] = None
+    return pd.Series(out, index=s.index)
+
+
+def acronym(s: pd.Series) -> pd.Series:
+    """first character of each whitespace-separated word"""
+    return s.str.findall(r"(?<!\S)\S").str.join("")
+
+
+def exactmatch(s: pd.Series) -> pd.Series:
+    """the value itself"""
+    return s
+
+
+SCHEMES = {
+    "first_nchars": first_nchars,
+    "last_nchars": last_nchars,
+    "find_ngrams": find_ngrams,
+    "acronym": acronym,
+    "exactmatch": exactmatch,
+}
+
+
+@dataclass
+class Signatures(BlockSchemes):
+    """
+    Computes forward index columns in-process.
+
+    Attributes
+    ----------
+    settings: Settings
+    """
+
+    settings: Settings
+
+    def compute(
+        self, df: pd.DataFrame, schemes: Optional[List[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Computes signatures for a batch of entities.
+
+        Parameters
+        ----------
+        df: pd.DataFrame
+            batch with `_index` and attribute columns
+        schemes: Optional[List[str]]
+            block scheme column names; defaults to all block schemes
+
+        Returns
+        ----------
+        pd.DataFrame
+            forward index for the batch: `_index` and one column per scheme
+        """
+        if schemes is None:
+            schemes = self.block_scheme_names
+        out = {"_index": df["_index"]}
+        for name in schemes:
+            scheme, attribute, n = self.block_scheme_params[name]
+            args = (n,) if n else ()
+            out[name] = SCHEMES[scheme](df[attribute], *args)
+        return pd.DataFrame(out)
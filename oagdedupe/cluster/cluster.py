@@ -2,7 +2,10 @@ from dataclasses import dataclass
 from typing import List, Union
 
 import networkx as nx
+import numpy as np
 import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 
 from oagdedupe import utils as du
 from oagdedupe.base import BaseCluster
@@ -127,3 +130,109 @@ class ConnectedComponents(BaseCluster):
             for rec_id in cluster
         ]
         return pd.DataFrame(clusters)
+
+
+@dataclass
+class SparseConnectedComponents(ConnectedComponents):
+    """
+    Retrieves connected components with scipy's sparse graph routines,
+    directly on the integer pair index arrays: no Python object is created
+    per edge or per entity
+
+    Clusters are the same as those of ConnectedComponents, the default,
+    but they are numbered differently; pass it as `cluster` to Dedupe or
+    RecordLinkage to opt in.
+    """
+
+    def _components(
+        self, left: np.ndarray, right: np.ndarray, n: int
+    ) -> np.ndarray:
+        """component of each of the n nodes of edges (left, right)"""
+        graph = coo_matrix(
+            (np.ones(len(left), dtype=np.int8), (left, right)), shape=(n, n)
+        )
+        _, labels = connected_components(graph, directed=False)
+        return labels
+
+    def get_connected_components(self, scores: pd.DataFrame) -> pd.DataFrame:
+        """
+        Connected components of the graph of pairs in scores.
+
+        Parameters
+        ----------
+        scores: pd.DataFrame
+            dataframe with pair indices and match scores
+
+        Returns
+        ----------
+        pd.DataFrame
+            dataframe mapping cluster index to entity index
+        """
+        nodes, edges = np.unique(
+            np.concatenate([scores["_index_l"], scores["_index_r"]]),
+            return_inverse=True,
+        )
+        left, right = np.split(edges, 2)
+        labels = self._components(left, right, len(nodes))
+        return pd.DataFrame({"cluster": labels, "_index": nodes, "_type": None})
+
+    def get_connected_components_link(
+        self, scores: pd.DataFrame
+    ) -> pd.DataFrame:
+        """
+        For record linkage: connected components of the bipartite graph of
+        pairs in scores; "_type" is True for entities of the left dataframe
+
+        Parameters
+        ----------
+        scores: pd.DataFrame
+            dataframe with pair indices and match scores
+
+        Returns
+        ----------
+        pd.DataFrame
+            dataframe mapping cluster index to entity index
+        """
+        nodes_l, left = np.unique(scores["_index_l"], return_inverse=True)
+        nodes_r, right = np.unique(scores["_index_r"], return_inverse=True)
+        n_left = len(nodes_l)
+        labels = self._components(left, n_left + right, n_left + len(nodes_r))
+        return pd.DataFrame(
+            {
+                "cluster": labels,
+                "_index": np.concatenate([nodes_l, nodes_r]),
+                "_type": np.arange(len(labels)) < n_left,
+            }
+        )
+
+
+@dataclass
+class DatabaseConnectedComponents(BaseCluster):
+    """
+    Computes connected components where scores are stored, by label
+    propagation, and writes them to clusters directly; scores are never
+    loaded into memory
+    """
+
+    repo: BaseRepository
+    settings: Settings
+
+    @du.recordlinkage
+    def get_df_cluster(
+        self, threshold: float = 0.8, rl: str = ""
+    ) -> Union[pd.DataFrame, List[pd.DataFrame]]:
+        """
+        Convert connected components to dataframe for user friendly output
+
+        Parameters
+        ----------
+        threshold: float
+            pairs below this score are not considered for clustering
+
+        Returns
+        ----------
+        pd.DataFrame
+            clusters merged with raw data
+        """
+        self.repo.save_connected_components(threshold=threshold)
+        return getattr(self.repo, f"get_clusters{rl}")()
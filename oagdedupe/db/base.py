@@ -131,9 +131,10 @@ class BaseRepositoryBlocking(ABC, BlockSchemes):
         for all block schemes and save output to `blocks_train`
 
         If full == True, for each conjunction (from best to worst),
-        construct forward index for a scheme at a time,
-        using "add_scheme()" and append output to `blocks_df`. If scheme already
-        exists in `blocks_df`, skip!
+        construct forward index for the schemes missing from `blocks_df`,
+        using "add_schemes()". If scheme already exists in `blocks_df`, skip!
+        With SettingsModel.single_scan, `conjunction` holds every scheme
+        used by the learned conjunctions, so `blocks_df` is built once.
 
         Parameters
         ----------
@@ -175,6 +176,29 @@ class BaseRepositoryBlocking(ABC, BlockSchemes):
         in sql, appends to `blocks_df`/`blocks_df_link`
         """
 
+    @abstractmethod
+    def add_schemes(
+        self,
+        schemes: List[str],
+        rl: str = "",
+    ) -> None:
+        """Only used for building forward index on full data;
+
+        Adds several schemes to blocks_df in a single pass over df, rather
+        than one pass per scheme.
+
+        Parameters
+        ----------
+        schemes: List[str]
+            names of schemes missing from blocks_df
+        rl: str
+            for recordlinkage, used by decorator
+
+        Returns
+        ----------
+        in sql, rebuilds `blocks_df`/`blocks_df_link`
+        """
+
     @abstractmethod
     def build_inverted_index(
         self, conjunction: Tuple[str], table: str, col: str = "_index_l"
@@ -186,6 +210,10 @@ class BaseRepositoryBlocking(ABC, BlockSchemes):
         the array. If none of the schemes returned an array, it's equivalent
         to the forward index itself.
 
+        In sql, the inverted index of each scheme (signature -> sorted list
+        of entities, with block size) is materialized once per forward index
+        and the conjunction's inverted index is assembled from those.
+
         Example with a conjunction containing two schemes:
 
         | first_letter_first_name | 3-grams | _index |
@@ -275,11 +303,67 @@ class BaseRepositoryBlocking(ABC, BlockSchemes):
         """
         pass
 
+    @abstractmethod
+    def estimate_stats(self, conjunction: Tuple[str], table: str) -> StatsDict:
+        """Estimates the number of pairs and reduction ratio of a conjunction
+        without generating its pairs, from the block-size histogram of each
+        scheme: exact for a single scheme, approximate for conjunctions.
+
+        Used to skip conjunctions that would generate more than
+        SettingsModel.max_compare pairs on full data.
+
+        Parameters
+        ----------
+        conjunction: Tuple[str]
+            tuple of block schemes
+        table: str
+            either "blocks_train" or "blocks_df"
+
+        Returns
+        ----------
+        StatsDict
+            with positives and negatives set to 0
+        """
+        pass
+
+    @abstractmethod
+    def get_persisted_stats(self) -> List[StatsDict]:
+        """Gets conjunction stats persisted by an earlier learning run on the
+        same train sample, so that active learning iterations that keep
+        the sample do not relearn them.
+
+        Pair counts and reduction ratios depend only on the sample and are
+        reused as is; if labels changed since, positive and negative
+        coverage are recounted against the current labels.
+
+        Returns
+        ----------
+        List[StatsDict]
+            empty if nothing was persisted for the current sample
+        """
+        pass
+
+    @abstractmethod
+    def persist_stats(self, stats: List[StatsDict]) -> None:
+        """Persists conjunction stats of the current train sample and labels,
+        replacing those of any earlier sample.
+
+        Parameters
+        ----------
+        stats: List[StatsDict]
+            stats of every conjunction scored while learning
+        """
+        pass
+
     @abstractmethod
     @du.recordlinkage
     def add_new_comparisons(
-        self, conjunction: Tuple[str], table: str, rl: str = ""
-    ) -> None:
+        self,
+        conjunction: Tuple[str],
+        table: str,
+        budget: Optional[int] = None,
+        rl: str = "",
+    ) -> int:
         """Appends comparison pairs from pairs_query() into a new table,
         either "comparisons" or "full_comparisons". See mapping from
         table to new_table below:
@@ -295,12 +379,17 @@ class BaseRepositoryBlocking(ABC, BlockSchemes):
             tuple of block schemes
         table: str
             either "blocks_train" or "blocks_df"
+        budget: Optional[int]
+            number of new pairs after which pair generation may stop
+            early; all pairs if None
         rl: str
             for recordlinkage, used by decorator
 
         Returns
         ----------
-        in sql, saves to either "comparisons" or "full_comparisons"
+        int
+            number of new pairs inserted; in sql, saves to either
+            "comparisons" or "full_comparisons"
         """
         pass
 
@@ -312,8 +401,8 @@ class BaseRepositoryBlocking(ABC, BlockSchemes):
         elif table == "blocks_df", use full_comparisons;
 
         This function is used when applying list of best conjunctions to
-        get comparison_pairs. We want to log the number of pairs to know
-        when to stop.
+        get comparison_pairs, to know how many pairs the table starts
+        with; the running total is then kept from add_new_comparisons().
 
         For "blocks_train", stopping rule is hard coded into
         oagdedupe.block.blocking.save(). For "blocks_full", stopping rule is
@@ -349,7 +438,9 @@ class BaseDistanceRepository(ABC):
         pass
 
     @abstractmethod
-    def save_distances(self, full: bool, labels: bool) -> None:
+    def save_distances(
+        self, full: bool, labels: bool
+    ) -> Optional[pd.DataFrame]:
         """saves computed distances
 
         - if labels is True, compute distances on `labels` table and save
@@ -364,7 +455,8 @@ class BaseDistanceRepository(ABC):
 
         Returns
         ----------
-        in sql, saves to 'labels_distances', 'full_distances', or 'distances'
+        in sql, saves to 'labels_distances', 'full_distances', or 'distances';
+        optionally returns a report of the distance computation
         """
         pass
 
@@ -429,6 +521,16 @@ class BaseFapiRepository(ABC):
         """
         pass
 
+    @abstractmethod
+    def with_attributes(self, pairs: pd.DataFrame) -> pd.DataFrame:
+        """Adds the raw attribute columns ("_l" and "_r" suffices) to pairs
+        from the distances table, if it does not hold them already.
+
+        Used to materialize attributes only for the samples passed to
+        LabelStudio.
+        """
+        pass
+
     @abstractmethod
     def get_labels(self) -> pd.DataFrame:
         """Get the labels_distances table (or labels) table;
@@ -450,6 +552,14 @@ class BaseClusterRepository(ABC):
         """
         pass
 
+    @abstractmethod
+    def save_connected_components(self, threshold: float) -> int:
+        """computes connected components of the pairs in `scores` above
+        threshold where they are stored and saves them to `clusters`,
+        replacing its contents; returns the number of rounds it took
+        """
+        pass
+
     @abstractmethod
     def merge_clusters_with_raw_data(self, df_clusters, rl):
         """wrapper for get_clusters() and get_clusters_link(); call
@@ -1,7 +1,9 @@
 """This module contains mixins with common methods in oagdedupe.block
 """
 
+import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from functools import cached_property
 from multiprocessing import Pool
@@ -9,15 +11,33 @@ from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import text
 
 import oagdedupe.utils as du
 from oagdedupe._typing import ENGINE, StatsDict
+from oagdedupe.block.pairsets import PairSets, block_pairs, pair_keys
 from oagdedupe.block.schemes import BlockSchemes
+from oagdedupe.block.signatures import Signatures
 from oagdedupe.db.base import BaseRepositoryBlocking
+from oagdedupe.db.postgres.bulk import copy_from
+from oagdedupe.db.postgres.pool import get_engine
 from oagdedupe.settings import Settings
 
 
+def array_literal(values: Optional[List[str]]) -> Optional[str]:
+    """formats a list of strings as a postgres array literal"""
+    if values is None:
+        return None
+    return (
+        "{"
+        + ",".join(
+            '"' + v.replace("\\", "\\\\").replace('"', '\\"') + '"'
+            for v in values
+        )
+        + "}"
+    )
+
+
 @dataclass
 class BlockingMixin:
     """convenience funcs particular to postgres"""
@@ -46,24 +66,19 @@ class BlockingMixin:
             );
         """
 
-    def query(self, sql: str) -> pd.DataFrame:
+    @property
+    def engine(self) -> ENGINE:
         """
-        for parallel implementation, need to create separate engine
-        for each process
+        pooled engine of the current process; for parallel implementation,
+        each worker process creates its own on first use
         """
-        engine = create_engine(self.settings.db.path_database)
-        res = pd.read_sql(sql, con=engine)
-        engine.dispose()
-        return res
+        return get_engine(self.settings)
+
+    def query(self, sql: str) -> pd.DataFrame:
+        return pd.read_sql(sql, con=self.engine)
 
     def execute(self, sql: str) -> None:
-        """
-        for parallel implementation, need to create separate engine
-        for each process
-        """
-        engine = create_engine(self.settings.db.path_database)
-        engine.execute(sql)
-        engine.dispose()
+        self.engine.execute(sql)
 
     @du.recordlinkage_both
     def n_df(self, rl: str = "") -> pd.DataFrame:
@@ -85,19 +100,110 @@ class BlockingMixin:
         reduced = self.n_comparisons - self.settings.model.max_compare
         return reduced / self.n_comparisons
 
+    def coltype(self, scheme: str) -> str:
+        """postgres type of a forward index column"""
+        if "ngrams" in scheme:
+            return "text[]"
+        return "text"
+
     def check_unnest(self, name):
         if "ngrams" in name:
             return f"unnest({name})"
         return name
 
-    def signatures(self, names):
-        return ", ".join(
-            [
-                f"{self.check_unnest(name)} as signature{i}"
-                for i, name in enumerate(names)
-            ]
+    def inverted_table(self, scheme: str, table: str) -> str:
+        """
+        name of the materialized inverted index of a scheme, e.g.
+        inv_train_exactmatch_name for blocks_train
+        """
+        return f"{table.replace('blocks_', 'inv_', 1)}_{scheme}"
+
+    @cached_property
+    def _percentiles(self) -> Dict[Tuple[str, float], int]:
+        """block size percentiles of inverted indices, computed once"""
+        return {}
+
+    def max_block_size(self, inverted: str) -> Optional[int]:
+        """
+        largest block size kept in an inverted index, from
+        SettingsModel.max_block_size and max_block_percentile; None if
+        blocks are not pruned
+
+        Percentiles are resolved to a number, rather than inlined as a
+        subquery, so that the planner can estimate the filtered blocks.
+        """
+        limits = []
+        if self.settings.model.max_block_size is not None:
+            limits.append(self.settings.model.max_block_size)
+        percentile = self.settings.model.max_block_percentile
+        if percentile is not None:
+            if (inverted, percentile) not in self._percentiles:
+                self._percentiles[(inverted, percentile)] = (
+                    self.query(
+                        f"""
+                    SELECT percentile_disc({percentile / 100})
+                        WITHIN GROUP (ORDER BY block_size) as block_size
+                    FROM {inverted}
+                """
+                    )["block_size"]
+                    .fillna(0)
+                    .astype(int)[0]
+                )
+            limits.append(self._percentiles[(inverted, percentile)])
+        if not limits:
+            return None
+        return min(limits)
+
+    def block_conditions(self, inverted: str, alias: str = "") -> List[str]:
+        """
+        conditions on the blocks of an inverted index that generate pairs:
+        for dedupe, singleton blocks cannot produce pairs; blocks above
+        the maximum block size are pruned
+        """
+        prefix = f"{alias}." if alias else ""
+        conditions = []
+        if self.settings.model.dedupe:
+            conditions.append(f"{prefix}block_size > 1")
+        limit = self.max_block_size(inverted)
+        if limit is not None:
+            conditions.append(f"{prefix}block_size <= {limit}")
+        return conditions
+
+    def where(self, conditions: List[str]) -> str:
+        if not conditions:
+            return ""
+        return "WHERE " + " AND ".join(conditions)
+
+    @property
+    def label_columns(self) -> str:
+        """columns read from the labels table"""
+        if self.settings.db.pair_key:
+            return "_index_l, _index_r, _pair_key, label"
+        return "_index_l, _index_r, label"
+
+    def label_join(self, labels: str, left: str, right: str) -> str:
+        """
+        condition joining the labels table (aliased `labels`) to pairs
+        with _index_l from alias `left` and _index_r from alias `right`;
+        uses the _pair_key index if SettingsDB.pair_key is set
+        """
+        if self.settings.db.pair_key:
+            return (
+                f"{labels}._pair_key = "
+                f"pair_key({left}._index_l, {right}._index_r)"
+            )
+        return (
+            f"{labels}._index_l = {left}._index_l "
+            f"AND {labels}._index_r = {right}._index_r"
         )
 
+    def histogram_table(self, scheme: str, table: str) -> str:
+        """
+        name of the block-size histogram of a scheme, e.g.
+        inv_df_exactmatch_name_hist for blocks_df
+        """
+        return f"{self.inverted_table(scheme, table)}_hist"
+
     def _aliases(self, names: Tuple[str]) -> List[str]:
         return [f"signature{i}" for i in range(len(names))]
 
@@ -128,18 +234,24 @@ class PostgresBlockingRepository(
             block schemes to include in forward index
         """
         if full:
-            for scheme in conjunction:
-
+            columns = self.query(
+                f"SELECT * FROM {self.settings.db.db_schema}.blocks_df{rl} LIMIT 1"
+            ).columns
+            missing = [
+                s for s in dict.fromkeys(conjunction) if s not in columns
+            ]
+            if missing:
                 logging.info(
-                    "building forward index on full data for scheme %s", scheme
+                    "building forward index on full data for schemes %s",
+                    missing,
                 )
-
-                columns = self.query(
-                    f"SELECT * FROM {self.settings.db.db_schema}.blocks_df LIMIT 1"
-                ).columns
-
-                if scheme not in columns:
-                    self.add_scheme(scheme=scheme, rl=rl)
+                self.add_schemes(schemes=missing, rl=rl)
+        elif self.settings.db.signature_engine == "pandas":
+            self._write_signatures(
+                table=f"train{rl}",
+                newtable=f"blocks_train{rl}",
+                schemes=self.block_scheme_names,
+            )
         else:
             self.execute(
                 self.query_blocks(
@@ -147,6 +259,233 @@ class PostgresBlockingRepository(
                 )
             )
 
+        if not full:
+            # without resampling, the sample and so its inverted indices
+            # are unchanged since they were built
+            self.build_inverted_indices(
+                table=f"blocks_train{rl}",
+                schemes=self.block_scheme_names,
+                replace=self.settings.model.resample,
+            )
+
+    def build_inverted_indices(
+        self, table: str, schemes: Tuple[str], replace: bool = True
+    ) -> None:
+        """
+        Materializes one inverted index per scheme from a forward index:
+        each row is a signature, the sorted list of entities that share it
+        and the size of that block.
+
+        The inverted indices of blocks_train are rebuilt with the forward
+        index, once per sample, and reused by get_conjunction_stats() and
+        add_new_comparisons(); those of blocks_df are built as needed.
+
+        Blocks above the maximum block size, if any, are recorded in the
+        pruned_blocks table when an inverted index is built. Histograms
+        built from a rebuilt inverted index are dropped with it.
+
+        Parameters
+        ----------
+        table : str
+            forward index, e.g. blocks_train or blocks_df_link
+        schemes : Tuple[str]
+            block schemes to index
+        replace : bool
+            rebuild inverted indices that already exist
+        """
+        if not replace:
+            existing = set(
+                self.query(
+                    f"""
+                SELECT tablename FROM pg_tables
+                WHERE schemaname = '{self.settings.db.db_schema}'
+                """
+                )["tablename"]
+            )
+            schemes = [
+                s
+                for s in dict.fromkeys(schemes)
+                if self.inverted_table(s, table) not in existing
+            ]
+        if not schemes:
+            return
+
+        sql = ""
+        for scheme in schemes:
+            inverted = f"{self.settings.db.db_schema}.{self.inverted_table(scheme, table)}"
+            for key in [k for k in self._percentiles if k[0] == inverted]:
+                del self._percentiles[key]
+            # histograms are built from inverted indices; for record
+            # linkage, the joint histogram is named after the left side
+            histogram = self.histogram_table(
+                scheme, table.replace("_link", "", 1)
+            )
+            sql += f"""
+            DROP TABLE IF EXISTS {inverted};
+            DROP TABLE IF EXISTS {self.settings.db.db_schema}.{histogram};
+
+            CREATE TABLE {inverted} as (
+                SELECT
+                    signature,
+                    array_agg(_index ORDER BY _index) as _indices,
+                    count(*)::integer as block_size
+                FROM (
+                    SELECT DISTINCT {self.check_unnest(scheme)} as signature, _index
+                    FROM {self.settings.db.db_schema}.{table}
+                ) t
+                WHERE signature IS NOT NULL
+                GROUP BY signature
+            );
+            """
+        self.execute(sql)
+        self._record_pruned_blocks(table=table, schemes=schemes)
+
+    def _record_pruned_blocks(self, table: str, schemes: List[str]) -> None:
+        """
+        Saves the blocks of each scheme's inverted index that exceed the
+        maximum block size to the pruned_blocks table and logs the largest.
+        """
+        schema = self.settings.db.db_schema
+        limits = {
+            scheme: self.max_block_size(
+                f"{schema}.{self.inverted_table(scheme, table)}"
+            )
+            for scheme in schemes
+        }
+        if all(limit is None for limit in limits.values()):
+            return
+        self.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {schema}.pruned_blocks (
+                forward_index text,
+                scheme text,
+                signature text,
+                block_size integer
+            );
+
+            DELETE FROM {schema}.pruned_blocks
+            WHERE forward_index = '{table}'
+            AND scheme IN ({", ".join(f"'{s}'" for s in schemes)});
+        """
+            + "".join(
+                f"""
+            INSERT INTO {schema}.pruned_blocks (
+                SELECT '{table}', '{scheme}', signature, block_size
+                FROM {schema}.{self.inverted_table(scheme, table)}
+                WHERE block_size > {limit}
+            );
+            """
+                for scheme, limit in limits.items()
+            )
+        )
+        pruned = self.get_pruned_blocks(table=table)
+        for scheme, blocks in pruned[pruned["scheme"].isin(schemes)].groupby(
+            "scheme"
+        ):
+            logging.info(
+                "pruned %d blocks of %s on %s; largest: %s",
+                len(blocks),
+                scheme,
+                table,
+                list(zip(blocks["signature"], blocks["block_size"]))[:5],
+            )
+
+    def get_pruned_blocks(self, table: str) -> pd.DataFrame:
+        """
+        Gets the blocks dropped from pair generation for exceeding the
+        maximum block size, largest first.
+
+        Parameters
+        ----------
+        table : str
+            forward index, e.g. blocks_train or blocks_df
+
+        Returns
+        ----------
+        pd.DataFrame
+            scheme, signature and block_size of each pruned block
+        """
+        schema = self.settings.db.db_schema
+        self.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {schema}.pruned_blocks (
+                forward_index text,
+                scheme text,
+                signature text,
+                block_size integer
+            )
+        """
+        )
+        return self.query(
+            f"""
+            SELECT scheme, signature, block_size
+            FROM {schema}.pruned_blocks
+            WHERE forward_index = '{table}'
+            ORDER BY block_size DESC, scheme, signature
+        """
+        )
+
+    def _write_signatures(
+        self, table: str, newtable: str, schemes: List[str]
+    ) -> None:
+        """
+        Streams `table` out of postgres in batches, computes signatures
+        in-process with oagdedupe.block.signatures and appends each batch
+        to `newtable`, which is (re)created first.
+
+        Parameters
+        ----------
+        table : str
+            source table with `_index` and attribute columns
+        newtable : str
+            destination table
+        schemes : List[str]
+            block schemes to compute
+        """
+        schema = self.settings.db.db_schema
+        self.execute(
+            f"""
+            DROP TABLE IF EXISTS {schema}.{newtable};
+
+            CREATE TABLE {schema}.{newtable} (
+                _index integer,
+                {", ".join(f"{s} {self.coltype(s)}" for s in schemes)}
+            );
+        """
+        )
+
+        attributes = sorted({self.block_scheme_params[s][1] for s in schemes})
+        signatures = Signatures(settings=self.settings)
+        engine = self.engine
+        with engine.connect() as con:
+            for chunk in pd.read_sql(
+                f"SELECT _index, {', '.join(attributes)} FROM {schema}.{table}",
+                con=con.execution_options(stream_results=True),
+                chunksize=self.settings.db.chunksize,
+            ):
+                self._copy(
+                    engine=engine,
+                    df=signatures.compute(chunk, schemes),
+                    table=newtable,
+                )
+
+    def _copy(self, engine: ENGINE, df: pd.DataFrame, table: str) -> None:
+        """
+        Appends a forward index batch to `table` with COPY; array columns
+        are written as postgres array literals.
+        """
+        df = df.copy()
+        for col in df.columns:
+            if "ngrams" in col:
+                df[col] = df[col].map(array_literal)
+        copy_from(
+            engine=engine,
+            data=df,
+            table=table,
+            schema=self.settings.db.db_schema,
+            chunksize=self.settings.db.chunksize,
+        )
+
     def add_scheme(
         self,
         scheme: str,
@@ -158,40 +497,109 @@ class PostgresBlockingRepository(
         check if column is in exists
         if not, add to blocks_df
         """
+        self.add_schemes(schemes=[scheme], rl=rl)
 
-        if "ngrams" in scheme:
-            coltype = "text[]"
-        else:
-            coltype = "text"
+    def add_schemes(
+        self,
+        schemes: List[str],
+        rl: str = "",
+    ) -> None:
+        """
+        Rebuilds blocks_df with new scheme columns in a single pass: the
+        existing forward index is joined to the new signatures in one
+        CREATE TABLE AS, instead of one table rewrite per scheme.
 
-        self.execute(
-            f"""
-            ALTER TABLE {self.settings.db.db_schema}.blocks_df{rl}
-            ADD COLUMN IF NOT EXISTS {scheme} {coltype}
+        With the "pandas" signature engine, signatures are computed
+        in-process into a staging table, which is then joined in.
+
+        Parameters
+        ----------
+        schemes : List[str]
+            block schemes missing from blocks_df
         """
-        )
+        schema = self.settings.db.db_schema
+
+        if self.settings.db.signature_engine == "pandas":
+            self._write_signatures(
+                table=f"df{rl}",
+                newtable=f"signatures_df{rl}",
+                schemes=schemes,
+            )
+            signatures = f"{schema}.signatures_df{rl}"
+            columns = [f"t2.{scheme}" for scheme in schemes]
+        else:
+            signatures = f"{schema}.df{rl}"
+            columns = [
+                f"{self.block_scheme_mapping[scheme]} as {scheme}"
+                for scheme in schemes
+            ]
 
         self.execute(
             f"""
-            UPDATE {self.settings.db.db_schema}.blocks_df{rl} AS t1
-            SET {scheme} = t2.{scheme}
-            FROM (
-                SELECT _index, {self.block_scheme_mapping[scheme]} as {scheme}
-                FROM {self.settings.db.db_schema}.df{rl}
-            ) t2
-            WHERE t1._index = t2._index;
+            DROP TABLE IF EXISTS {schema}.blocks_df{rl}_new;
+
+            CREATE TABLE {schema}.blocks_df{rl}_new as (
+                SELECT t1.*, {", ".join(columns)}
+                FROM {schema}.blocks_df{rl} t1
+                JOIN {signatures} t2
+                    USING (_index)
+            );
+
+            DROP TABLE {schema}.blocks_df{rl};
+            ALTER TABLE {schema}.blocks_df{rl}_new RENAME TO blocks_df{rl};
+            DROP TABLE IF EXISTS {schema}.signatures_df{rl};
         """
         )
-        return
 
     def build_inverted_index(
-        self, conjunction: Tuple[str], table: str, col: str = "_index_l"
+        self,
+        conjunction: Tuple[str],
+        table: str,
+        col: str = "_index_l",
+        signature_range: Optional[Tuple[Optional[str], Optional[str]]] = None,
+        n_partitions: int = 1,
     ) -> str:
-        return f"""
-        SELECT
-            {self.signatures(conjunction)}, _index {col}
-        FROM {self.settings.db.db_schema}.{table}
         """
+        Assembles the exploded inverted index of a conjunction from the
+        materialized inverted index of each scheme: blocks are unnested
+        back to (signature, _index) rows and joined on _index.
+
+        Blocks that cannot or should not produce pairs (see
+        block_conditions()) are dropped before the join.
+
+        If signature_range is given, only blocks of the first scheme with
+        :lower <= signature < :upper are kept (a None bound is open); the
+        bounds are bound parameters supplied when the query is executed.
+        Likewise, if n_partitions > 1, only blocks of the first scheme in
+        hash partition :partition of the signature are kept.
+        """
+        inverted = [
+            f"{self.settings.db.db_schema}.{self.inverted_table(scheme, table)}"
+            for scheme in conjunction
+        ]
+        conditions = [self.block_conditions(inv) for inv in inverted]
+        if signature_range is not None:
+            lower, upper = signature_range
+            if lower is not None:
+                conditions[0].append("signature >= :lower")
+            if upper is not None:
+                conditions[0].append("signature < :upper")
+        if n_partitions > 1:
+            conditions[0].append(
+                f"(hashtext(signature::text) & 2147483647) % {n_partitions} = :partition"
+            )
+        subqueries = [
+            f"""(
+                SELECT signature as signature{i}, unnest(_indices) as {col}
+                FROM {inv}
+                {self.where(conditions[i])}
+            ) t{i}"""
+            for i, inv in enumerate(inverted)
+        ]
+        inverted_index = subqueries[0]
+        for subquery in subqueries[1:]:
+            inverted_index += f" JOIN {subquery} USING ({col})"
+        return f"SELECT * FROM {inverted_index}"
 
     @du.recordlinkage
     def get_conjunction_stats(
@@ -230,7 +638,7 @@ class PostgresBlockingRepository(
                     {self.pairs_query(conjunction)}
                 ),
                 labels AS (
-                    SELECT _index_l, _index_r, label
+                    SELECT {self.label_columns}
                     FROM {self.settings.db.db_schema}.labels
                 )
             SELECT
@@ -239,8 +647,7 @@ class PostgresBlockingRepository(
                 SUM(CASE WHEN t2.label = 0 THEN 1 ELSE 0 END) negatives
             FROM pairs t1
             LEFT JOIN labels t2
-                ON t2._index_l = t1._index_l
-                AND t2._index_r = t1._index_r
+                ON {self.label_join("t2", "t1", "t1")}
             """
             )
             .fillna(0)
@@ -254,7 +661,283 @@ class PostgresBlockingRepository(
         return StatsDict(**res)
 
     @du.recordlinkage
-    def pairs_query(self, conjunction: Tuple[str], rl: str = "") -> str:
+    def build_histograms(
+        self, table: str, schemes: Tuple[str], rl: str = ""
+    ) -> None:
+        """
+        Materializes the block-size histogram of each scheme from its
+        inverted index: the number of blocks of each size and the number
+        of pairs they generate, leaving out pruned blocks.
+
+        For record linkage, blocks are sized on both sides, so the
+        histogram is over (block_size, block_size_link).
+
+        Parameters
+        ----------
+        table : str
+            forward index, either blocks_train or blocks_df
+        schemes : Tuple[str]
+            block schemes
+        """
+        schema = self.settings.db.db_schema
+        for forward_index in {table, table + rl}:
+            self.build_inverted_indices(
+                table=forward_index, schemes=schemes, replace=False
+            )
+        sql = ""
+        for scheme in schemes:
+            inverted = f"{schema}.{self.inverted_table(scheme, table)}"
+            if rl == "":
+                histogram = f"""
+                    SELECT
+                        block_size,
+                        count(*) as n_blocks,
+                        sum(block_size::bigint * (block_size - 1) / 2) as n_pairs
+                    FROM {inverted}
+                    {self.where(self.block_conditions(inverted))}
+                    GROUP BY block_size
+                """
+            else:
+                inverted_link = (
+                    f"{schema}.{self.inverted_table(scheme, table + rl)}"
+                )
+                histogram = f"""
+                    SELECT
+                        t1.block_size,
+                        t2.block_size as block_size_link,
+                        count(*) as n_blocks,
+                        sum(t1.block_size::bigint * t2.block_size) as n_pairs
+                    FROM {inverted} t1
+                    JOIN {inverted_link} t2
+                        USING (signature)
+                    {self.where(
+                        self.block_conditions(inverted, alias="t1")
+                        + self.block_conditions(inverted_link, alias="t2")
+                    )}
+                    GROUP BY t1.block_size, t2.block_size
+                """
+            sql += f"""
+            CREATE TABLE IF NOT EXISTS
+            {schema}.{self.histogram_table(scheme, table)} as (
+                {histogram}
+            );
+            """
+        self.execute(sql)
+
+    def estimate_stats(self, conjunction: Tuple[str], table: str) -> StatsDict:
+        """
+        Estimates the number of pairs and reduction ratio of a conjunction
+        from block-size histograms, without generating any pair.
+
+        For a single scheme, the number of pairs is the sum over blocks of
+        c * (c - 1) / 2 (c_l * c_r for record linkage), which is exact for
+        schemes with one signature per entity; for n-gram schemes a pair
+        is counted once per n-gram it shares, so it is an upper bound.
+
+        For a conjunction, schemes are assumed independent: the share of
+        all comparisons covered by the conjunction is the product of the
+        shares covered by each scheme, capped by the smallest scheme.
+
+        Parameters
+        ----------
+        conjunction : Tuple[str]
+            tuple of block schemes
+        table : str
+            forward index, either blocks_train or blocks_df
+
+        Returns
+        ----------
+        StatsDict
+            positives and negatives are not estimated and set to 0
+        """
+        schemes = tuple(dict.fromkeys(conjunction))
+        self.build_histograms(table=table, schemes=schemes)
+        n_pairs = self.query(
+            " UNION ALL ".join(
+                f"""
+                SELECT coalesce(sum(n_pairs), 0) as n_pairs
+                FROM {self.settings.db.db_schema}.{self.histogram_table(s, table)}
+                """
+                for s in schemes
+            )
+        )["n_pairs"].astype(float)
+        estimate = min(
+            self.n_comparisons * np.prod(n_pairs / self.n_comparisons),
+            n_pairs.min(),
+        )
+        return StatsDict(
+            n_pairs=estimate,
+            positives=0,
+            negatives=0,
+            conjunction=conjunction,
+            rr=1 - (estimate / self.n_comparisons),
+        )
+
+    @du.recordlinkage_both
+    def _train_md5(self, rl: str = "") -> str:
+        return self.query(
+            f"""
+            SELECT md5(string_agg(_index::text, ',' ORDER BY _index))
+            FROM {self.settings.db.db_schema}.train{rl}
+        """
+        )["md5"].values[0]
+
+    def sample_fingerprint(self) -> str:
+        """
+        identifies the train sample: its entities, the size of the data it
+        was drawn from, the block schemes and block pruning
+        """
+        key = [
+            str(self._train_md5()),
+            str(self.n_comparisons),
+            ",".join(self.block_scheme_names),
+            str(self.settings.model.max_block_size),
+            str(self.settings.model.max_block_percentile),
+        ]
+        return hashlib.md5("|".join(key).encode()).hexdigest()
+
+    def labels_version(self) -> str:
+        """identifies the current contents of the labels table"""
+        return self.query(
+            f"""
+            SELECT md5(string_agg(
+                concat_ws(',', _index_l, _index_r, label), ';'
+                ORDER BY _index_l, _index_r
+            ))
+            FROM {self.settings.db.db_schema}.labels
+        """
+        )["md5"].values[0]
+
+    @du.recordlinkage
+    def label_coverage(self, rl: str = "") -> pd.DataFrame:
+        """
+        For each labelled pair, whether each block scheme generates it,
+        i.e. puts both entities in the same block that is not pruned.
+
+        Returns
+        ----------
+        pd.DataFrame
+            labels, plus a boolean column per block scheme
+        """
+        schema = self.settings.db.db_schema
+        labels = self.query(
+            f"SELECT _index_l, _index_r, label FROM {schema}.labels"
+        )
+        covered = self.query(
+            " UNION ALL ".join(
+                f"""
+                SELECT DISTINCT '{scheme}' as scheme, t1._index_l, t2._index_r
+                FROM ({self.build_inverted_index((scheme,), "blocks_train")}) t1
+                JOIN ({self.build_inverted_index(
+                    (scheme,), "blocks_train" + rl, col="_index_r"
+                )}) t2
+                    ON t1.signature0 = t2.signature0
+                JOIN {schema}.labels
+                    ON {self.label_join("labels", "t1", "t2")}
+                """
+                for scheme in self.block_scheme_names
+            )
+        )
+        keys = pair_keys(labels["_index_l"], labels["_index_r"])
+        for scheme in self.block_scheme_names:
+            pairs = covered[covered["scheme"] == scheme]
+            labels[scheme] = np.isin(
+                keys, pair_keys(pairs["_index_l"], pairs["_index_r"])
+            )
+        return labels
+
+    def _create_stats_table(self) -> None:
+        self.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS
+            {self.settings.db.db_schema}.conjunction_stats (
+                fingerprint text,
+                labels_version text,
+                conjunction text[],
+                n_pairs bigint,
+                positives bigint,
+                negatives bigint,
+                rr double precision
+            )
+        """
+        )
+
+    def get_persisted_stats(self) -> List[StatsDict]:
+        """
+        Reads conjunction stats persisted for the current train sample from
+        the conjunction_stats table; if labels changed since, positives and
+        negatives are recounted from label_coverage().
+        """
+        self._create_stats_table()
+        df = self.query(
+            f"""
+            SELECT * FROM {self.settings.db.db_schema}.conjunction_stats
+            WHERE fingerprint = '{self.sample_fingerprint()}'
+        """
+        )
+        if len(df) == 0:
+            return []
+        df["conjunction"] = df["conjunction"].map(tuple)
+
+        if (df["labels_version"] != self.labels_version()).any():
+            logging.info("labels changed; recounting conjunction coverage")
+            coverage = self.label_coverage()
+            positive = coverage["label"] == 1
+            negative = coverage["label"] == 0
+            for i, conjunction in df["conjunction"].items():
+                covered = coverage[list(conjunction)].all(axis=1)
+                df.loc[i, "positives"] = (covered & positive).sum()
+                df.loc[i, "negatives"] = (covered & negative).sum()
+
+        return [
+            StatsDict(
+                n_pairs=r.n_pairs,
+                positives=r.positives,
+                negatives=r.negatives,
+                conjunction=r.conjunction,
+                rr=r.rr,
+            )
+            for r in df.itertuples()
+        ]
+
+    def persist_stats(self, stats: List[StatsDict]) -> None:
+        """
+        Replaces the contents of the conjunction_stats table with the stats
+        of the current train sample and labels.
+        """
+        self._create_stats_table()
+        self.execute(
+            f"TRUNCATE TABLE {self.settings.db.db_schema}.conjunction_stats"
+        )
+        fingerprint, labels_version = (
+            self.sample_fingerprint(),
+            self.labels_version(),
+        )
+        df = pd.DataFrame(
+            [
+                {
+                    "fingerprint": fingerprint,
+                    "labels_version": labels_version,
+                    "conjunction": array_literal(list(x.conjunction)),
+                    "n_pairs": x.n_pairs,
+                    "positives": x.positives,
+                    "negatives": x.negatives,
+                    "rr": x.rr,
+                }
+                for x in stats
+            ]
+        )
+        if len(df) > 0:
+            self._copy(engine=self.engine, df=df, table="conjunction_stats")
+
+    @du.recordlinkage
+    def pairs_query(
+        self, conjunction: Tuple[str], rl: str = "", ordered: bool = False
+    ) -> str:
+        """
+        pairs of the conjunction; ordered by key if `ordered`, so that
+        concurrent inserts lock keys in the same order and cannot deadlock
+        """
         if rl == "":
             where = "WHERE t1._index_l < t2._index_r"
         else:
@@ -268,18 +951,178 @@ class PostgresBlockingRepository(
                 )}
             {where}
             GROUP BY _index_l, _index_r
+            {"ORDER BY _index_l, _index_r" if ordered else ""}
+            """
+
+    def signature_pairs(
+        self, scheme: str, table: str, rl: str = ""
+    ) -> pd.DataFrame:
+        """
+        Number of pairs generated by each block of a scheme, in signature
+        order. Block sizes of the scheme bound the pairs of any conjunction
+        that starts with it.
+
+        Parameters
+        ----------
+        scheme : str
+            first block scheme of the conjunction
+        table : str
+            table name of forward index
+        rl : str
+            "_link" for record linkage
+
+        Returns
+        ----------
+        pd.DataFrame
+            signature, n_pairs
+        """
+        inv = (
+            f"{self.settings.db.db_schema}.{self.inverted_table(scheme, table)}"
+        )
+        if rl == "":
+            return self.query(
+                f"""
+                SELECT signature, block_size::bigint * (block_size - 1) / 2 as n_pairs
+                FROM {inv}
+                {self.where(self.block_conditions(inv))}
+                ORDER BY signature
+                """
+            )
+        inv_link = f"{self.settings.db.db_schema}.{self.inverted_table(scheme, table + rl)}"
+        return self.query(
+            f"""
+            SELECT t1.signature, t1.block_size::bigint * t2.block_size as n_pairs
+            FROM {inv} t1
+            JOIN {inv_link} t2 USING (signature)
+            {self.where(
+                self.block_conditions(inv, alias="t1")
+                + self.block_conditions(inv_link, alias="t2")
+            )}
+            ORDER BY signature
             """
+        )
+
+    @staticmethod
+    def signature_ranges(
+        blocks: pd.DataFrame, chunksize: int
+    ) -> List[Tuple[Optional[str], Optional[str]]]:
+        """
+        Splits signatures into consecutive ranges, in signature order,
+        that each generate about `chunksize` pairs; a single block larger
+        than that gets a range of its own.
+
+        Parameters
+        ----------
+        blocks : pd.DataFrame
+            signature, n_pairs; see signature_pairs()
+        chunksize : int
+            number of pairs per range
+
+        Returns
+        ----------
+        List[Tuple[Optional[str], Optional[str]]]
+            (lower, upper) bounds, lower inclusive and upper exclusive;
+            None is open
+        """
+        cumulative = blocks["n_pairs"].cumsum().values
+        bounds, start = [], 0
+        for i in range(1, len(blocks)):
+            if cumulative[i] - start > chunksize:
+                bounds.append(blocks["signature"].values[i])
+                start = cumulative[i - 1]
+        return list(zip([None] + bounds, bounds + [None]))
+
+    def n_partitions(self, table: str, n_pairs: int) -> int:
+        """
+        Number of hash partitions of the signatures that pair generation
+        for full_comparisons runs concurrently: up to SettingsModel.cpus,
+        but no more than needed for partitions of SettingsDB.chunksize
+        pairs. Comparisons on the sample are always generated serially.
+        """
+        if table != "blocks_df":
+            return 1
+        return int(
+            max(
+                1,
+                min(
+                    self.settings.model.cpus,
+                    np.ceil(n_pairs / self.settings.db.chunksize),
+                ),
+            )
+        )
+
+    def _insert_pairs(
+        self,
+        conjunction: Tuple[str],
+        table: str,
+        rl: str,
+        signature_range: Optional[Tuple[Optional[str], Optional[str]]],
+        partition: Optional[Tuple[int, int]] = None,
+    ) -> int:
+        """
+        Inserts the pairs of a range of signatures, or of one of its hash
+        partitions given as (partition, n_partitions), in a single
+        statement on a pooled connection.
+        """
+        lower, upper = signature_range or (None, None)
+        partition, n_partitions = partition or (0, 1)
+        return self.engine.execute(
+            text(
+                f"""
+                INSERT INTO {self.settings.db.db_schema}.{self.comptab_map[table]} (_index_l, _index_r)
+                (
+                    WITH
+                        inverted_index AS (
+                            {self.build_inverted_index(
+                                conjunction,
+                                table,
+                                signature_range=signature_range,
+                                n_partitions=n_partitions,
+                            )}
+                        ),
+                        inverted_index_link AS (
+                            {self.build_inverted_index(
+                                conjunction,
+                                table + rl,
+                                col="_index_r",
+                                signature_range=signature_range,
+                                n_partitions=n_partitions,
+                            )}
+                        )
+                    {self.pairs_query(conjunction, ordered=n_partitions > 1)}
+                )
+                ON CONFLICT DO NOTHING
+                """
+            ),
+            lower=lower,
+            upper=upper,
+            partition=partition,
+        ).rowcount
 
     @du.recordlinkage
     def add_new_comparisons(
-        self, conjunction: Tuple[str], table: str, rl: str = ""
-    ) -> None:
+        self,
+        conjunction: Tuple[str],
+        table: str,
+        budget: Optional[int] = None,
+        rl: str = "",
+    ) -> int:
         """
         Given forward index, construct inverted index.
         Then for each row in inverted index, get all "nC2" distinct
         combinations of size 2 from the array.
 
-        Concatenates and returns all distinct pairs.
+        Appends all distinct pairs to comparisons or full_comparisons.
+
+        Pairs are inserted in chunks of signature ranges of the first
+        scheme (see signature_ranges()), each committed on its own. Once
+        `budget` new pairs have been inserted the remaining chunks are
+        skipped, so the table holds the pairs of whole chunks only.
+
+        For full_comparisons, each chunk is further split into hash
+        partitions of the signature (see n_partitions()) that are inserted
+        concurrently on separate connections; a pair found by several
+        partitions is kept once by ON CONFLICT DO NOTHING.
 
         Parameters
         ----------
@@ -287,30 +1130,54 @@ class PostgresBlockingRepository(
             list of block schemes
         table : str
             table name of forward index
+        budget : Optional[int]
+            number of new pairs after which to stop; all pairs if None
 
         Returns
         ----------
-        pd.DataFrame
+        int
+            number of new pairs inserted, i.e. not already in the table
         """
-        newtable = self.comptab_map[table]
-        engine = create_engine(self.settings.db.path_database)
-        engine.execute(
-            f"""
-            INSERT INTO {self.settings.db.db_schema}.{newtable} (_index_l, _index_r)
-            (
-                WITH
-                    inverted_index AS (
-                        {self.build_inverted_index(conjunction, table)}
-                    ),
-                    inverted_index_link AS (
-                        {self.build_inverted_index(conjunction, table+rl, col="_index_r")}
-                    )
-                {self.pairs_query(conjunction)}
+        for forward_index in {table, table + rl}:
+            self.build_inverted_indices(
+                table=forward_index, schemes=conjunction, replace=False
             )
-            ON CONFLICT DO NOTHING
-            """
+        blocks = self.signature_pairs(conjunction[0], table, rl=rl)
+        n_partitions = self.n_partitions(table, blocks["n_pairs"].sum())
+        ranges = self.signature_ranges(
+            blocks, chunksize=self.settings.db.chunksize * n_partitions
         )
-        engine.dispose()
+        n_workers = min(
+            n_partitions,
+            self.settings.db.pool_size + self.settings.db.max_overflow,
+        )
+        n_inserted = 0
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            for i, signature_range in enumerate(ranges):
+                if budget is not None and n_inserted >= budget:
+                    logging.info(
+                        "%s: budget of %d pairs reached after %d of %d chunks",
+                        conjunction,
+                        budget,
+                        i,
+                        len(ranges),
+                    )
+                    break
+                if len(ranges) == 1:
+                    signature_range = None
+                n_inserted += sum(
+                    executor.map(
+                        lambda partition: self._insert_pairs(
+                            conjunction,
+                            table,
+                            rl,
+                            signature_range,
+                            (partition, n_partitions),
+                        ),
+                        range(n_partitions),
+                    )
+                )
+        return n_inserted
 
     def get_n_pairs(self, table: str) -> int:
         newtable = self.comptab_map[table]
@@ -319,3 +1186,99 @@ class PostgresBlockingRepository(
             SELECT count(*) FROM {self.settings.db.db_schema}.{newtable}
         """
         )["count"].values[0]
+
+
+@dataclass
+class PostgresMemoryBlockingRepository(PostgresBlockingRepository):
+    """
+    Computes conjunction stats on the train sample from pair sets held in
+    memory: the inverted index of each scheme is loaded once per sample,
+    after which a conjunction is an intersection of sorted arrays rather
+    than a self-join in postgres.
+    """
+
+    settings: Settings
+
+    def build_forward_indices(
+        self,
+        full: bool = False,
+        rl: str = "",
+        conjunction: Optional[Tuple[str]] = None,
+    ) -> None:
+        """
+        Builds forward indices as in PostgresBlockingRepository; the pair
+        sets are reloaded whenever the train sample is rebuilt.
+        """
+        super().build_forward_indices(full=full, rl=rl, conjunction=conjunction)
+        if not full:
+            self.pairsets = self.load_pairsets()
+
+    @cached_property
+    def pairsets(self) -> PairSets:
+        """pair sets of the current train sample, loaded once"""
+        return self.load_pairsets()
+
+    @du.recordlinkage
+    def load_pairsets(self, rl: str = "") -> PairSets:
+        """
+        Loads the pair set of every scheme from the inverted indices of
+        blocks_train, along with the labels.
+
+        Returns
+        ----------
+        PairSets
+        """
+        schema = self.settings.db.db_schema
+        keys = {}
+        for scheme in self.block_scheme_names:
+            inverted = f"{schema}.{self.inverted_table(scheme, 'blocks_train')}"
+            if rl == "":
+                blocks = self.query(
+                    f"""
+                    SELECT _indices FROM {inverted}
+                    {self.where(self.block_conditions(inverted))}
+                """
+                )
+                keys[scheme] = block_pairs(blocks["_indices"].tolist())
+            else:
+                inverted_link = f"{schema}.{self.inverted_table(scheme, 'blocks_train' + rl)}"
+                blocks = self.query(
+                    f"""
+                    SELECT t1._indices, t2._indices as _indices_link
+                    FROM {inverted} t1
+                    JOIN {inverted_link} t2
+                        USING (signature)
+                    {self.where(
+                        self.block_conditions(inverted, alias="t1")
+                        + self.block_conditions(inverted_link, alias="t2")
+                    )}
+                """
+                )
+                keys[scheme] = block_pairs(
+                    blocks["_indices"].tolist(),
+                    blocks["_indices_link"].tolist(),
+                )
+        labels = self.query(f"SELECT {self.label_columns} FROM {schema}.labels")
+        return PairSets(keys=keys, labels=labels)
+
+    @du.recordlinkage
+    def get_conjunction_stats(
+        self, conjunction: Tuple[str], table: str, rl: str = ""
+    ) -> StatsDict:
+        """
+        Computes number of pairs, positive coverage and negative coverage
+        of a conjunction from the in-memory pair sets; forward indices
+        other than blocks_train fall back to SQL.
+        """
+        if table != "blocks_train":
+            return super().get_conjunction_stats(
+                conjunction=conjunction, table=table, rl=rl
+            )
+        n_pairs, positives, negatives = self.pairsets.stats(conjunction)
+        return StatsDict(
+            n_pairs=n_pairs,
+            positives=positives,
+            negatives=negatives,
+            conjunction=conjunction,
+            rr=1 - (n_pairs / self.n_comparisons),
+        )
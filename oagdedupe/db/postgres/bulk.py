@@ -0,0 +1,91 @@
+"""This module contains the bulk loader shared by repositories.
+
+Rows are streamed into postgres with COPY ... FROM STDIN as CSV, in
+batches of a bounded number of rows, rather than as one parameterized
+INSERT per row built from a Python dict.
+"""
+
+import io
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from oagdedupe._typing import ENGINE
+
+
+def copy_from(
+    engine: ENGINE,
+    data: Union[pd.DataFrame, np.ndarray],
+    table: str,
+    schema: str,
+    columns: Optional[List[str]] = None,
+    chunksize: int = 50_000,
+) -> int:
+    """
+    Appends rows to `schema.table` with COPY, `chunksize` rows at a time,
+    in a single transaction; NaN and None are loaded as NULL.
+
+    Float columns loaded into integer columns of the table, e.g. integer
+    columns that pandas upcast to float to hold NaN, are written as
+    nullable integers so that COPY does not receive values such as 1.0.
+
+    Parameters
+    ----------
+    engine: ENGINE
+    data: Union[pd.DataFrame, np.ndarray]
+        rows to load; a 2d array needs `columns`
+    table: str
+        name of an existing table
+    schema: str
+    columns: Optional[List[str]]
+        table columns to load, in the order of the columns of data;
+        defaults to the column names of data
+    chunksize: int
+        number of rows per COPY batch
+
+    Returns
+    ----------
+    int
+        number of rows loaded
+    """
+    if isinstance(data, np.ndarray):
+        data = pd.DataFrame(data, columns=columns)
+    columns = list(data.columns) if columns is None else columns
+    conn = engine.raw_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT column_name FROM information_schema.columns
+                WHERE table_schema = %s AND table_name = %s
+                AND data_type IN ('smallint', 'integer', 'bigint')
+                """,
+                (schema, table),
+            )
+            integers = {row[0] for row in cursor.fetchall()}
+            data = data.astype(
+                {
+                    col: "Int64"
+                    for col, target in zip(data.columns, columns)
+                    if target in integers
+                    and pd.api.types.is_float_dtype(data[col])
+                }
+            )
+            for start in range(0, len(data), chunksize):
+                buffer = io.StringIO()
+                data.iloc[start : start + chunksize].to_csv(
+                    buffer, index=False, header=False, na_rep=r"\N"
+                )
+                buffer.seek(0)
+                cursor.copy_expert(
+                    f"""
+                    COPY {schema}.{table} ({", ".join(columns)})
+                    FROM STDIN WITH (FORMAT csv, NULL '\\N')
+                    """,
+                    buffer,
+                )
+        conn.commit()
+    finally:
+        conn.close()
+    return len(data)
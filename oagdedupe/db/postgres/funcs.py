@@ -20,6 +20,16 @@ def create_functions(settings: Settings):
     """
     )
 
+    engine.execute(
+        """
+        CREATE OR REPLACE FUNCTION pair_key(l integer, r integer) RETURNS bigint
+        AS $$
+        SELECT (l::bigint << 32) | (r::bigint & 4294967295)
+        $$
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+    """
+    )
+
     engine.execute(
         """
         CREATE OR REPLACE FUNCTION first_nchars(s text, n integer) RETURNS text
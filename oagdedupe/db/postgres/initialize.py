@@ -3,6 +3,7 @@ import logging
 from dataclasses import dataclass
 from typing import List
 
+import pandas as pd
 from dependency_injector.wiring import Provide
 from sqlalchemy import delete, func, select
 
@@ -183,12 +184,34 @@ class InitializeRepository(BaseInitializeRepository, Tables):
             session.merge(train)
         session.commit()
 
+    def _drop_inverted_indices(self, prefix: str) -> None:
+        """drop materialized inverted indices whose names start with prefix,
+        e.g. "inv_train" for those built from blocks_train
+
+        (only required for sql implementation)
+        """
+        tables = pd.read_sql(
+            f"""
+            SELECT tablename FROM pg_tables
+            WHERE schemaname = '{self.settings.db.db_schema}'
+            AND starts_with(tablename, '{prefix}_')
+            """,
+            con=self.engine,
+        )["tablename"]
+        if len(tables) > 0:
+            self.engine.execute(
+                f"""DROP TABLE {", ".join(
+                    f"{self.settings.db.db_schema}.{t}" for t in tables
+                )}"""
+            )
+
     @du.recordlinkage_repeat
     def _init_forward_index_full(self, rl: str = "") -> None:
         """initialize full index table
 
         (only required for sql implementation)
         """
+        self._drop_inverted_indices(prefix=f"inv_df{rl}")
         self.engine.execute(
             f"""
             DROP TABLE IF EXISTS {self.settings.db.db_schema}.blocks_df{rl};
@@ -202,12 +225,16 @@ class InitializeRepository(BaseInitializeRepository, Tables):
         )
 
     def resample(self) -> None:
-        """resample unlabelled from train"""
+        """resample unlabelled from train, unless SettingsModel.resample is
+        off, in which case only derived tables are reset; the inverted
+        indices of blocks_train are kept while the sample is unchanged"""
         with self.Session() as session:
-            self._delete_unlabelled_from_train(session=session)
-            self._truncate_unlabelled()
-            self._init_unlabelled(session=session)
-            self.resample_unlabelled(session=session)
+            if self.settings.model.resample:
+                self._delete_unlabelled_from_train(session=session)
+                self._truncate_unlabelled()
+                self._init_unlabelled(session=session)
+                self.resample_unlabelled(session=session)
+                self._drop_inverted_indices(prefix="inv_train")
             self._init_forward_index_full()
             # reset table
             for table in [
@@ -2,22 +2,32 @@
 general queries and database modification
 """
 
-import json
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from typing import List
+from functools import partial
+from itertools import chain
+from multiprocessing import Pool
+from typing import List, Optional, Tuple
 
+import joblib
 import numpy as np
 import pandas as pd
 import requests
-from sqlalchemy import create_engine, func, insert, select, types, update
+from sqlalchemy import create_engine, func, insert, select, text, update
 from sqlalchemy.orm import aliased
 from tqdm import tqdm
 
 from oagdedupe import utils as du
-from oagdedupe._typing import SESSION, SUBQUERY, TABLE
+from oagdedupe._typing import (ARRAY_MEDIA_TYPE, SESSION, SUBQUERY, TABLE,
+                               array_from_bytes, array_to_bytes)
 from oagdedupe.db.base import (BaseClusterRepository, BaseDistanceRepository,
                                BaseFapiRepository)
+from oagdedupe.db.postgres.bulk import copy_from
+from oagdedupe.db.postgres.pool import get_engine
 from oagdedupe.db.postgres.tables import Tables
+from oagdedupe.distance import comparators
 from oagdedupe.settings import Settings
 
 
@@ -35,6 +45,18 @@ class DistanceRepository(BaseDistanceRepository, Tables):
             aliased(getattr(self, mapping[table] + rl)),
         )
 
+    def pending(self, table: TABLE):
+        """
+        condition on the rows of table whose distances are not computed,
+        i.e. pairs inserted since distances were last computed; distance
+        stages only touch these rows and set _computed
+        """
+        return table._computed.is_(False)
+
+    def pending_sql(self, alias: str) -> str:
+        """pending() for raw SQL, on table aliased `alias`"""
+        return f"NOT {alias}._computed"
+
     def get_attributes(self, table: TABLE) -> None:
         dataL, dataR = self.fields_table(table.__tablename__)
         with self.Session() as session:
@@ -43,6 +65,7 @@ class DistanceRepository(BaseDistanceRepository, Tables):
                 .where(
                     table._index_l == dataL._index,
                     table._index_r == dataR._index,
+                    self.pending(table),
                 )
                 .values(
                     {
@@ -65,13 +88,17 @@ class DistanceRepository(BaseDistanceRepository, Tables):
         with self.Session() as session:
             q = (
                 update(table)
+                .where(self.pending(table))
                 .values(
                     {
-                        getattr(table, attr): func.jarowinkler(
-                            getattr(table, f"{attr}_l"),
-                            getattr(table, f"{attr}_r"),
-                        ).label(attr)
-                        for attr in self.settings.attributes
+                        **{
+                            getattr(table, attr): func.jarowinkler(
+                                getattr(table, f"{attr}_l"),
+                                getattr(table, f"{attr}_r"),
+                            ).label(attr)
+                            for attr in self.settings.attributes
+                        },
+                        table._computed: True,
                     }
                 )
                 .execution_options(synchronize_session=False)
@@ -80,20 +107,450 @@ class DistanceRepository(BaseDistanceRepository, Tables):
             session.execute(q)
             session.commit()
 
-    def save_distances(self, full: bool, labels: bool) -> None:
+    def compute_distances_joined(self, table: TABLE) -> None:
+        """
+        computes distances from the attributes of df (or train), joined on
+        the pair indices, without storing the attributes on table
+        """
+        dataL, dataR = self.fields_table(table.__tablename__)
+        with self.Session() as session:
+            q = (
+                update(table)
+                .where(
+                    table._index_l == dataL._index,
+                    table._index_r == dataR._index,
+                    self.pending(table),
+                )
+                .values(
+                    {
+                        **{
+                            attr: func.jarowinkler(
+                                getattr(dataL, attr), getattr(dataR, attr)
+                            )
+                            for attr in self.settings.attributes
+                        },
+                        "_computed": True,
+                    }
+                )
+                .execution_options(synchronize_session=False)
+            )
+            session.execute(q)
+            session.commit()
+
+    def _create_chunks_table(self) -> None:
+        self.engine.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS
+            {self.settings.db.db_schema}.distance_chunks (
+                table_name text,
+                n_rows bigint,
+                lower integer,
+                upper integer,
+                done boolean
+            )
+        """
+        )
+
+    def distance_chunks(self, table: TABLE) -> pd.DataFrame:
+        """
+        _index_l ranges of about SettingsDB.chunksize rows each, in which
+        distances of table are computed.
+
+        The plan is persisted in the distance_chunks table with the chunks
+        already done, so that an interrupted computation resumes where it
+        stopped. Rows of table are only grouped by _index_l to plan the
+        chunks when there is no plan yet or the number of rows of table
+        changed since it was made.
+
+        Returns
+        ----------
+        pd.DataFrame
+            lower (inclusive) and upper (exclusive) _index_l of the chunks
+            not done yet
+        """
+        schema = self.settings.db.db_schema
+        name = table.__tablename__
+        self._create_chunks_table()
+        n_rows = pd.read_sql(
+            f"SELECT count(*) as n FROM {schema}.{name}", con=self.engine
+        )["n"].values[0]
+        plan = pd.read_sql(
+            text(
+                f"""
+                SELECT * FROM {schema}.distance_chunks
+                WHERE table_name = :name
+                """
+            ),
+            con=self.engine,
+            params={"name": name},
+        )
+        if len(plan) > 0 and (plan["n_rows"] == n_rows).all():
+            logging.info(
+                "resuming distances of %s: %d of %d chunks done",
+                name,
+                plan["done"].sum(),
+                len(plan),
+            )
+            return plan.loc[~plan["done"], ["lower", "upper"]]
+
+        counts = pd.read_sql(
+            f"""
+            SELECT _index_l, count(*) as n
+            FROM {schema}.{name}
+            GROUP BY _index_l
+            ORDER BY _index_l
+            """,
+            con=self.engine,
+        )
+        index_l = counts["_index_l"].values
+        cumulative = counts["n"].cumsum().values
+        bounds, start = [index_l[0]] if len(counts) else [], 0
+        for i in range(1, len(counts)):
+            if cumulative[i] - start > self.settings.db.chunksize:
+                bounds.append(index_l[i])
+                start = cumulative[i - 1]
+        plan = pd.DataFrame(
+            {
+                "table_name": name,
+                "n_rows": n_rows,
+                "lower": bounds,
+                "upper": bounds[1:] + [index_l[-1] + 1] if bounds else [],
+                "done": False,
+            }
+        )
+        self.engine.execute(
+            f"""
+            DELETE FROM {schema}.distance_chunks
+            WHERE table_name = '{name}'
+        """
+        )
+        plan.to_sql(
+            "distance_chunks",
+            schema=schema,
+            con=self.engine,
+            if_exists="append",
+            index=False,
+        )
+        return plan[["lower", "upper"]]
+
+    def _compute_chunk(
+        self, table: TABLE, lower: int, upper: int, joined: bool
+    ) -> None:
+        """
+        fills the attributes, unless joined, and computes the distances of
+        the rows of table with lower <= _index_l < upper; the chunk is
+        marked as done in the same transaction
+        """
+        dataL, dataR = self.fields_table(table.__tablename__)
+        values = {
+            attr: func.jarowinkler(getattr(dataL, attr), getattr(dataR, attr))
+            for attr in self.settings.attributes
+        }
+        values["_computed"] = True
+        if not joined:
+            for attr in self.settings.attributes:
+                values[f"{attr}_l"] = getattr(dataL, attr)
+                values[f"{attr}_r"] = getattr(dataR, attr)
+        q = (
+            update(table)
+            .where(
+                table._index_l == dataL._index,
+                table._index_r == dataR._index,
+                table._index_l >= lower,
+                table._index_l < upper,
+                self.pending(table),
+            )
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+        with get_engine(self.settings).begin() as conn:
+            conn.execute(q)
+            conn.execute(
+                text(
+                    f"""
+                    UPDATE {self.settings.db.db_schema}.distance_chunks
+                    SET done = true
+                    WHERE table_name = :name
+                    AND lower = :lower
+                    AND upper = :upper
+                    """
+                ),
+                {"name": table.__tablename__, "lower": lower, "upper": upper},
+            )
+
+    def compute_distances_chunked(
+        self, table: TABLE, joined: bool = False
+    ) -> None:
+        """
+        computes distances of table in chunks of _index_l ranges (see
+        distance_chunks()), each committed on its own, on up to
+        SettingsModel.cpus pooled connections concurrently
+
+        Parameters
+        ----------
+        table: TABLE
+            comparisons or full_comparisons
+        joined: bool
+            whether comparisons hold no attribute columns, see
+            SettingsDB.normalize_comparisons
+        """
+        chunks = self.distance_chunks(table)
+        n_workers = max(
+            1,
+            min(
+                self.settings.model.cpus,
+                len(chunks),
+                self.settings.db.pool_size + self.settings.db.max_overflow,
+            ),
+        )
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = [
+                executor.submit(
+                    self._compute_chunk, table, int(lower), int(upper), joined
+                )
+                for lower, upper in chunks.itertuples(index=False)
+            ]
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                future.result()
+        self.engine.execute(
+            f"""
+            DELETE FROM {self.settings.db.db_schema}.distance_chunks
+            WHERE table_name = '{table.__tablename__}'
+        """
+        )
+
+    def compute_distances_numpy(
+        self, table: TABLE, joined: bool = False
+    ) -> None:
+        """
+        streams pairs and their attributes out of postgres in batches of
+        SettingsDB.chunksize, computes distances in SettingsModel.cpus
+        worker processes with the comparators in SettingsModel.comparators,
+        and COPYs them to a staging table that updates table in one pass
+
+        Parameters
+        ----------
+        table: TABLE
+            labels, comparisons or full_comparisons
+        joined: bool
+            whether attribute values are joined in from df (or train)
+            instead of read from the table
+        """
+        schema = self.settings.db.db_schema
+        name = table.__tablename__
+        attributes = self.settings.attributes
+        if joined:
+            left, right = self.source_tables(name)
+            columns = [f"l.{x} as {x}_l" for x in attributes] + [
+                f"r.{x} as {x}_r" for x in attributes
+            ]
+            joins = f"""
+                JOIN {schema}.{left} l ON t._index_l = l._index
+                JOIN {schema}.{right} r ON t._index_r = r._index
+            """
+        else:
+            columns = [f"t.{x}_l" for x in attributes] + [
+                f"t.{x}_r" for x in attributes
+            ]
+            joins = ""
+
+        staging = f"{name}_distances"
+        self.engine.execute(
+            f"""
+            DROP TABLE IF EXISTS {schema}.{staging};
+            CREATE UNLOGGED TABLE {schema}.{staging} (
+                _index_l integer,
+                _index_r integer,
+                {", ".join(f"{x} double precision" for x in attributes)}
+            );
+        """
+        )
+        compute = partial(
+            comparators.compute_distances,
+            attributes=attributes,
+            comparators=self.settings.model.comparators,
+        )
+        with Pool(self.settings.model.cpus) as p:
+            with get_engine(self.settings).connect() as con:
+                chunks = pd.read_sql(
+                    f"""
+                    SELECT t._index_l, t._index_r, {", ".join(columns)}
+                    FROM {schema}.{name} t
+                    {joins}
+                    WHERE {self.pending_sql("t")}
+                    """,
+                    con=con.execution_options(stream_results=True),
+                    chunksize=self.settings.db.chunksize,
+                )
+                for df in tqdm(p.imap(compute, chunks)):
+                    copy_from(
+                        engine=get_engine(self.settings),
+                        data=df,
+                        table=staging,
+                        schema=self.settings.db.db_schema,
+                        chunksize=self.settings.db.chunksize,
+                    )
+
+        self.engine.execute(
+            f"""
+            UPDATE {schema}.{name} t
+            SET {", ".join(f"{x} = s.{x}" for x in attributes)},
+                _computed = true
+            FROM {schema}.{staging} s
+            WHERE t._index_l = s._index_l
+            AND t._index_r = s._index_r;
+            DROP TABLE {schema}.{staging};
+        """
+        )
+
+    @du.recordlinkage
+    def source_tables(self, table: str, rl: str = "") -> Tuple[str, str]:
+        """names of the tables holding the attributes of each side"""
+        name = {"comparisons": "train", "full_comparisons": "df"}[table]
+        return name, name + rl
+
+    def compute_distances_distinct(
+        self, table: TABLE, joined: bool = False
+    ) -> pd.DataFrame:
+        """
+        computes the distance of each attribute once per distinct pair of
+        values: distinct (value_l, value_r) pairs are scored into a lookup
+        table, which is then joined back on the values
+
+        Parameters
+        ----------
+        table: TABLE
+            labels, comparisons or full_comparisons
+        joined: bool
+            whether attribute values are joined in from df (or train)
+            instead of read from the table, see compute_distances_joined()
+
+        Returns
+        ----------
+        pd.DataFrame
+            per attribute, the number of pairs, the number of distinct
+            value pairs and their ratio
+        """
+        schema = self.settings.db.db_schema
+        name = table.__tablename__
+        from_tables = [f"{schema}.{name} t"]
+        conditions = [self.pending_sql("t")]
+        if joined:
+            left, right = self.source_tables(name)
+            from_tables += [f"{schema}.{left} l", f"{schema}.{right} r"]
+            conditions += ["t._index_l = l._index", "t._index_r = r._index"]
+
+        n_pairs = pd.read_sql(
+            f"""
+            SELECT count(*) FROM {schema}.{name} t
+            WHERE {self.pending_sql("t")}
+            """,
+            con=self.engine,
+        )["count"][0]
+        report = []
+        for attr in self.settings.attributes:
+            if joined:
+                value_l, value_r = f"l.{attr}", f"r.{attr}"
+            else:
+                value_l, value_r = f"t.{attr}_l", f"t.{attr}_r"
+            lookup = f"{schema}.{name}_{attr}_distances"
+            self.engine.execute(
+                f"""
+                DROP TABLE IF EXISTS {lookup};
+                CREATE UNLOGGED TABLE {lookup} AS (
+                    SELECT value_l, value_r, jarowinkler(value_l, value_r) as distance
+                    FROM (
+                        SELECT DISTINCT {value_l} as value_l, {value_r} as value_r
+                        FROM {", ".join(from_tables)}
+                        WHERE {" AND ".join(conditions)}
+                    ) v
+                );
+            """
+            )
+            n_distinct = pd.read_sql(
+                f"SELECT count(*) FROM {lookup}", con=self.engine
+            )["count"][0]
+            self.engine.execute(
+                f"""
+                UPDATE {schema}.{name} t
+                SET {attr} = d.distance
+                FROM {", ".join(from_tables[1:] + [f"{lookup} d"])}
+                WHERE {" AND ".join(
+                    conditions
+                    + [f"{value_l} = d.value_l", f"{value_r} = d.value_r"]
+                )};
+                DROP TABLE {lookup};
+            """
+            )
+            logging.info(
+                "%s.%s: %d distinct value pairs for %d pairs",
+                name,
+                attr,
+                n_distinct,
+                n_pairs,
+            )
+            report.append(
+                {
+                    "attribute": attr,
+                    "n_pairs": n_pairs,
+                    "n_distinct": n_distinct,
+                    "ratio": n_pairs / max(n_distinct, 1),
+                }
+            )
+        self.engine.execute(
+            f"""
+            UPDATE {schema}.{name} t SET _computed = true
+            WHERE {self.pending_sql("t")}
+        """
+        )
+        return pd.DataFrame(report)
+
+    def save_distances(
+        self, full: bool, labels: bool
+    ) -> Optional[pd.DataFrame]:
         """
         merge attributes on to dataframe with just comparison pair indices
         assign "_l" and "_r" suffices
+
+        if SettingsDB.normalize_comparisons is set, comparisons have no
+        attribute columns and distances are computed from joined attributes
+
+        if SettingsDB.distance_engine is "distinct", distances are computed
+        once per distinct pair of attribute values; if "numpy", in worker
+        processes; otherwise, distances of full_comparisons are computed in
+        resumable chunks, see compute_distances_chunked()
+
+        distances are only computed for pairs not computed yet (see
+        pending()), so reruns cost as much as the pairs inserted since the
+        last one
+
+        Returns
+        ----------
+        Optional[pd.DataFrame]
+            with the "distinct" engine, the number of pairs and of distinct
+            value pairs per attribute, see compute_distances_distinct()
         """
         if labels:
             table = self.Labels
+        elif full:
+            table = self.FullComparisons
         else:
-            if full:
-                table = self.FullComparisons
-            else:
-                table = self.Comparisons
+            table = self.Comparisons
+        joined = not labels and self.settings.db.normalize_comparisons
+        if full and self.settings.db.distance_engine == "rows":
+            self.compute_distances_chunked(table=table, joined=joined)
+            return
+        if not labels and not joined:
             self.get_attributes(table=table)
-        self.compute_distances(table=table)
+
+        if self.settings.db.distance_engine == "distinct":
+            return self.compute_distances_distinct(table=table, joined=joined)
+        if self.settings.db.distance_engine == "numpy":
+            self.compute_distances_numpy(table=table, joined=joined)
+        elif joined:
+            self.compute_distances_joined(table=table)
+        else:
+            self.compute_distances(table=table)
 
 
 @dataclass
@@ -166,6 +623,96 @@ class ClusterRepository(BaseClusterRepository, Tables):
                 dflist.append(pd.read_sql(q.statement, q.session.bind))
             return dflist
 
+    @du.recordlinkage
+    def save_connected_components(self, threshold: float, rl: str = "") -> int:
+        """
+        writes the connected components of the graph of pairs scoring above
+        threshold to `clusters`, without reading scores out of postgres:
+        every entity is first labelled by its own node id, then repeatedly
+        takes the smallest label among its neighbours and the label of the
+        node its label points to, until no label changes
+
+        for record linkage, entities of df and df_link are distinct nodes,
+        2 * _index and 2 * _index + 1
+
+        Parameters
+        ----------
+        threshold: float
+            pairs at or below this score are not considered
+
+        Returns
+        ----------
+        int
+            number of label propagation rounds
+        """
+        schema = self.settings.db.db_schema
+        if rl:
+            node_l, node_r = "2 * _index_l::bigint", "2 * _index_r::bigint + 1"
+            index, _type = "node / 2", "node % 2 = 0"
+        else:
+            node_l, node_r = "_index_l", "_index_r"
+            index, _type = "node", "NULL::boolean"
+        with self.engine.begin() as con:
+            con.execute(
+                text(
+                    f"""
+                    CREATE TEMP TABLE cc_edges ON COMMIT DROP AS
+                    SELECT {node_l} AS a, {node_r} AS b
+                    FROM {schema}.scores
+                    WHERE score > {threshold};
+
+                    INSERT INTO cc_edges SELECT b, a FROM cc_edges;
+                    CREATE INDEX ON cc_edges (a);
+
+                    CREATE TEMP TABLE cc_labels ON COMMIT DROP AS
+                    SELECT DISTINCT a AS node, a AS label FROM cc_edges;
+                    ALTER TABLE cc_labels ADD PRIMARY KEY (node);
+                    ANALYZE cc_edges, cc_labels;
+                """
+                )
+            )
+            propagate = text(
+                """
+                UPDATE cc_labels t SET label = m.label
+                FROM (
+                    SELECT e.a AS node, min(l.label) AS label
+                    FROM cc_edges e
+                    JOIN cc_labels l ON l.node = e.b
+                    GROUP BY e.a
+                ) m
+                WHERE t.node = m.node AND m.label < t.label
+            """
+            )
+            # labels are node ids of the same component: jump ahead to the
+            # label of the label
+            jump = text(
+                """
+                UPDATE cc_labels t SET label = p.label
+                FROM cc_labels p
+                WHERE p.node = t.label AND p.label < t.label
+            """
+            )
+            rounds, changed = 0, True
+            while changed:
+                rounds += 1
+                changed = con.execute(propagate).rowcount > 0
+                changed |= con.execute(jump).rowcount > 0
+            logging.info("connected components in %d rounds", rounds)
+            con.execute(
+                text(
+                    f"""
+                    TRUNCATE {schema}.clusters;
+                    INSERT INTO {schema}.clusters (cluster, _index, _type)
+                    SELECT
+                        dense_rank() OVER (ORDER BY label) - 1,
+                        {index},
+                        {_type}
+                    FROM cc_labels;
+                """
+                )
+            )
+        return rounds
+
     def merge_clusters_with_raw_data(self, df_clusters, rl):
 
         self.bulk_insert(df=df_clusters, to_table=self.Clusters)
@@ -178,13 +725,28 @@ class ClusterRepository(BaseClusterRepository, Tables):
 
 @dataclass
 class FapiRepository(BaseFapiRepository, Tables):
-    def predict(self, dists):
-        return json.loads(
-            requests.post(
-                f"{self.settings.fast_api.url}/predict",
-                json={"dists": dists.tolist()},
-            ).content
+    def predict(self, dists: np.ndarray) -> np.ndarray:
+        """
+        posts distances to fastapi /predict/array as a binary float32 array,
+        without the _index_l and _index_r columns
+
+        Parameters
+        ----------
+        dists: np.ndarray
+            distances, then _index_l and _index_r
+
+        Returns
+        ----------
+        np.ndarray
+            predicted probabilities of non-match and match
+        """
+        res = requests.post(
+            f"{self.settings.fast_api.url}/predict/array",
+            data=array_to_bytes(dists[:, :-2]),
+            headers={"Content-Type": ARRAY_MEDIA_TYPE},
         )
+        res.raise_for_status()
+        return array_from_bytes(res.content)
 
     def full_distance_partitions(self) -> select:
         return select(
@@ -192,7 +754,21 @@ class FapiRepository(BaseFapiRepository, Tables):
                 getattr(self.FullComparisons, x)
                 for x in self.settings.attributes + ["_index_l", "_index_r"]
             )
-        ).execution_options(yield_per=50000)
+        ).execution_options(yield_per=self.settings.db.chunksize)
+
+    def scorer(self):
+        """
+        function scoring an array of distances (attributes, then _index_l
+        and _index_r) into match probabilities: with
+        SettingsModel.scoring_engine "local", the estimator persisted at
+        SettingsModel.path_model is loaded once and called in-process;
+        otherwise each partition is posted to fastapi, see predict()
+        """
+        if self.settings.model.scoring_engine != "local":
+            return self.predict
+        estimator = joblib.load(self.settings.model.path_model)
+        logging.info(f"reading model: {self.settings.model.path_model}")
+        return lambda dists: estimator.predict_proba(dists[:, :-2])
 
     def update_train(self, newlabels: pd.DataFrame) -> None:
         """
@@ -223,19 +799,56 @@ class FapiRepository(BaseFapiRepository, Tables):
         ----------
         pd.DataFrame
         """
+        if self.settings.db.pair_key:
+            on = self.Comparisons._pair_key == self.Labels._pair_key
+        else:
+            on = (self.Comparisons._index_l == self.Labels._index_l) & (
+                self.Comparisons._index_r == self.Labels._index_r
+            )
         with self.Session() as session:
             q = (
                 session.query(self.Comparisons)
-                .join(
-                    self.Labels,
-                    (self.Comparisons._index_l == self.Labels._index_l)
-                    & (self.Comparisons._index_r == self.Labels._index_r),
-                    isouter=True,
-                )
+                .join(self.Labels, on, isouter=True)
                 .filter(self.Labels.label == None)
             )
             return pd.read_sql(q.statement, q.session.bind)
 
+    @du.recordlinkage
+    def with_attributes(
+        self, pairs: pd.DataFrame, rl: str = ""
+    ) -> pd.DataFrame:
+        """
+        adds attribute comparison columns to pairs from the train sample,
+        if comparisons do not already hold them
+        (see SettingsDB.normalize_comparisons)
+
+        Parameters
+        ----------
+        pairs: pd.DataFrame
+            pairs from comparisons, e.g. samples to label
+
+        Returns
+        ----------
+        pd.DataFrame
+        """
+        if not self.settings.db.normalize_comparisons:
+            return pairs
+        sides = [("l", self.Train), ("r", getattr(self, f"Train{rl}"))]
+        with self.Session() as session:
+            for side, table in sides:
+                q = session.query(
+                    *(
+                        getattr(table, x).label(f"{x}_{side}")
+                        for x in self.settings.attributes + ["_index"]
+                    )
+                ).filter(table._index.in_(pairs[f"_index_{side}"].tolist()))
+                pairs = pairs.merge(
+                    pd.read_sql(q.statement, q.session.bind),
+                    on=f"_index_{side}",
+                    how="left",
+                )
+        return pairs
+
     def get_labels(self) -> pd.DataFrame:
         """
         query the labels table
@@ -248,41 +861,78 @@ class FapiRepository(BaseFapiRepository, Tables):
             query = session.query(self.Labels)
             return pd.read_sql(query.statement, query.session.bind)
 
-    def save_predictions(self):
-        with self.Session() as session:
-
-            stmt = self.full_distance_partitions()
-
-            for i, partition in tqdm(
-                enumerate(session.execute(stmt).partitions())
-            ):
-
-                dists = np.array(
-                    [
-                        [
-                            getattr(row, x)
-                            for x in self.settings.attributes
-                            + ["_index_l", "_index_r"]
-                        ]
-                        for row in partition
-                    ]
-                )
-
-                preds = np.array(self.predict(dists))
+    def score_partition(self, predict, dists: np.ndarray) -> pd.DataFrame:
+        """
+        scores one partition of distances, see scorer(); pairs scoring below
+        SettingsModel.min_score are dropped
+        """
+        preds = np.array(predict(dists))
+        keep = preds[:, 1] >= self.settings.model.min_score
+        return pd.DataFrame(
+            {
+                "score": preds[keep, 1],
+                "_index_l": dists[keep, -2].astype(int),
+                "_index_r": dists[keep, -1].astype(int),
+            }
+        )
 
-                probs = pd.DataFrame(
-                    np.hstack([preds[:, 1:], dists[:, -2:]]),
-                    columns=["score", "_index_l", "_index_r"],
-                )
+    def write_scores(self, probs: pd.DataFrame, replace: bool) -> None:
+        """appends scored pairs to "scores", or recreates it first"""
+        if replace:
+            self.Scores.__table__.drop(self.engine, checkfirst=True)
+            self.Scores.__table__.create(self.engine)
+        copy_from(
+            engine=self.engine,
+            data=probs,
+            table="scores",
+            schema=self.settings.db.db_schema,
+            chunksize=self.settings.db.chunksize,
+        )
 
-                probs.to_sql(
-                    "scores",
-                    schema=self.settings.db.db_schema,
-                    if_exists="append" if i > 0 else "replace",
-                    con=self.engine,
-                    index=False,
-                    dtype={
-                        "_index_l": types.Integer(),
-                        "_index_r": types.Integer(),
-                    },
-                )
+    def save_predictions(self):
+        """
+        scores full_comparisons into "scores" as a three-stage pipeline:
+        this thread streams partitions out of postgres while up to
+        SettingsModel.cpus partitions are scored in a thread pool and a
+        writer thread appends scored partitions to "scores", in order
+
+        each stage holds at most SettingsModel.cpus partitions in flight
+        and blocks the one before it once full, so memory stays bounded
+        and throughput is that of the slowest stage
+        """
+        predict = self.scorer()
+        n_workers = max(self.settings.model.cpus, 1)
+        scoring, writing = deque(), deque()
+        n_written = 0
+        with self.Session() as session, ThreadPoolExecutor(
+            n_workers
+        ) as scorers, ThreadPoolExecutor(1) as writer:
+            stmt = self.full_distance_partitions()
+            partitions = tqdm(session.execute(stmt).partitions())
+            for partition in chain(partitions, [None]):
+                last = partition is None
+                if not last:
+                    scoring.append(
+                        scorers.submit(
+                            self.score_partition,
+                            predict,
+                            np.array(partition, dtype=float),
+                        )
+                    )
+                # scored partitions go to the writer in order; the reader
+                # waits on the oldest once a stage has n_workers in flight
+                while scoring and (
+                    last or len(scoring) > n_workers or scoring[0].done()
+                ):
+                    writing.append(
+                        writer.submit(
+                            self.write_scores,
+                            scoring.popleft().result(),
+                            replace=n_written == 0,
+                        )
+                    )
+                    n_written += 1
+                while writing and (
+                    last or len(writing) > n_workers or writing[0].done()
+                ):
+                    writing.popleft().result()
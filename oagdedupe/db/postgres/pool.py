@@ -0,0 +1,80 @@
+"""This module contains pooled engines shared by repository methods that
+run in worker processes.
+
+Engines are created lazily, once per process: a process forked after an
+engine was created (e.g. by multiprocessing.Pool) discards the inherited
+engine without closing its connections, which still belong to the parent,
+and creates its own on first use.
+"""
+
+import os
+from typing import Dict, Tuple
+
+from sqlalchemy import create_engine, event
+
+from oagdedupe._typing import ENGINE
+from oagdedupe.settings import Settings
+
+_ENGINES: Dict[Tuple[str, int, int], ENGINE] = {}
+
+_COUNTS: Dict[str, int] = {"connects": 0, "checkouts": 0}
+
+
+def _on_connect(dbapi_connection, connection_record) -> None:
+    _COUNTS["connects"] += 1
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    _COUNTS["checkouts"] += 1
+
+
+def get_engine(settings: Settings) -> ENGINE:
+    """
+    Gets the pooled engine of the current process, creating it on first
+    use with SettingsDB.pool_size and SettingsDB.max_overflow.
+
+    Parameters
+    ----------
+    settings: Settings
+
+    Returns
+    ----------
+    ENGINE
+    """
+    key = (
+        settings.db.path_database,
+        settings.db.pool_size,
+        settings.db.max_overflow,
+    )
+    if key not in _ENGINES:
+        engine = create_engine(
+            settings.db.path_database,
+            pool_size=settings.db.pool_size,
+            max_overflow=settings.db.max_overflow,
+            pool_pre_ping=True,
+        )
+        event.listen(engine.pool, "connect", _on_connect)
+        event.listen(engine.pool, "checkout", _on_checkout)
+        _ENGINES[key] = engine
+    return _ENGINES[key]
+
+
+def pool_stats() -> Dict[str, int]:
+    """
+    connection counters of the current process: new connections opened,
+    checkouts from the pool and checkouts that reused a connection
+    """
+    return {
+        **_COUNTS,
+        "reused": _COUNTS["checkouts"] - _COUNTS["connects"],
+    }
+
+
+def _after_fork_in_child() -> None:
+    for engine in _ENGINES.values():
+        engine.dispose(close=False)
+    _ENGINES.clear()
+    _COUNTS.update(connects=0, checkouts=0)
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -5,7 +5,8 @@ import pandas as pd
 from sqlalchemy import create_engine
 
 from oagdedupe.db.base import BaseRepository
-from oagdedupe.db.postgres.blocking import PostgresBlockingRepository
+from oagdedupe.db.postgres.blocking import (PostgresBlockingRepository,
+                                            PostgresMemoryBlockingRepository)
 from oagdedupe.db.postgres.initialize import InitializeRepository
 from oagdedupe.db.postgres.orm import (ClusterRepository, DistanceRepository,
                                        FapiRepository)
@@ -31,4 +32,6 @@ class PostgresRepository(
 
     @cached_property
     def blocking(self):
+        if self.settings.db.stats_engine == "memory":
+            return PostgresMemoryBlockingRepository(settings=self.settings)
         return PostgresBlockingRepository(settings=self.settings)
@@ -6,13 +6,15 @@ from dataclasses import dataclass
 from functools import cached_property
 
 import pandas as pd
-from sqlalchemy import (Boolean, Column, Float, Integer, MetaData, String,
-                        create_engine)
+from sqlalchemy import (DDL, BigInteger, Boolean, Column, Computed, Float,
+                        Index, Integer, MetaData, String, create_engine, event,
+                        false)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.schema import CreateSchema
 
 from oagdedupe._typing import TABLE
+from oagdedupe.db.postgres.bulk import copy_from
 from oagdedupe.settings import Settings
 
 
@@ -145,11 +147,18 @@ class Tables(TablesRecordLinkage):
 
     @property
     def BaseAttributesDistances(self):
-        """mixin table used to share attribute distances"""
+        """mixin table used to share attribute distances; _computed is set
+        by the distance update, so that a NULL distance, e.g. of a NULL
+        attribute value, is not recomputed"""
         return type(
             "Attributes",
             (object,),
-            {k: Column(Float) for k in self.settings.attributes},
+            {
+                **{k: Column(Float) for k in self.settings.attributes},
+                "_computed": Column(
+                    Boolean, nullable=False, server_default=false()
+                ),
+            },
         )
 
     @property
@@ -164,6 +173,44 @@ class Tables(TablesRecordLinkage):
             },
         )
 
+    @property
+    def BaseComparisons(self) -> tuple:
+        """
+        mixin tables of comparisons and full_comparisons: attribute
+        distances, plus attribute comparison columns unless
+        SettingsDB.normalize_comparisons is set
+        """
+        if self.settings.db.normalize_comparisons:
+            return (self.BaseAttributesDistances,)
+        return (self.BaseAttributesDistances, self.BaseAttributeComparisons)
+
+    def pair_columns(self) -> dict:
+        """
+        columns identifying a pair of entities: the composite primary key
+        (_index_l, _index_r), or, if SettingsDB.pair_key is set, a BIGINT
+        _pair_key generated from them as primary key; the mapper still
+        identifies rows by (_index_l, _index_r), which are then indexed
+        together for the joins and updates that use them
+        """
+        if not self.settings.db.pair_key:
+            return {
+                "_index_l": Column(Integer, primary_key=True),
+                "_index_r": Column(Integer, primary_key=True),
+            }
+        index_l = Column(Integer, nullable=False)
+        index_r = Column(Integer, nullable=False)
+        return {
+            "_index_l": index_l,
+            "_index_r": index_r,
+            "_pair_key": Column(
+                BigInteger,
+                Computed("pair_key(_index_l, _index_r)", persisted=True),
+                primary_key=True,
+            ),
+            "__mapper_args__": {"primary_key": [index_l, index_r]},
+            "__table_args__": (Index(None, "_index_l", "_index_r"),),
+        }
+
     @cached_property
     def maindf(self):
         """table for df"""
@@ -240,8 +287,7 @@ class Tables(TablesRecordLinkage):
             ),
             {
                 "__tablename__": "labels",
-                "_index_l": Column(Integer, primary_key=True),
-                "_index_r": Column(Integer, primary_key=True),
+                **self.pair_columns(),
                 "label": Column(Integer),
             },
         )
@@ -251,15 +297,10 @@ class Tables(TablesRecordLinkage):
         """table for comparisons"""
         return type(
             "comparisons",
-            (
-                self.BaseAttributesDistances,
-                self.BaseAttributeComparisons,
-                self.Base,
-            ),
+            (*self.BaseComparisons, self.Base),
             {
                 "__tablename__": "comparisons",
-                "_index_l": Column(Integer, primary_key=True),
-                "_index_r": Column(Integer, primary_key=True),
+                **self.pair_columns(),
                 "label": Column(Integer),
             },
         )
@@ -269,15 +310,10 @@ class Tables(TablesRecordLinkage):
         """table for full_comparisons"""
         return type(
             "full_comparisons",
-            (
-                self.BaseAttributesDistances,
-                self.BaseAttributeComparisons,
-                self.Base,
-            ),
+            (*self.BaseComparisons, self.Base),
             {
                 "__tablename__": "full_comparisons",
-                "_index_l": Column(Integer, primary_key=True),
-                "_index_r": Column(Integer, primary_key=True),
+                **self.pair_columns(),
                 "label": Column(Integer),
             },
         )
@@ -301,17 +337,58 @@ class Tables(TablesRecordLinkage):
 
     @cached_property
     def Scores(self):
-        """table for linkage scores"""
-        return type(
+        """
+        table for linkage scores; with SettingsDB.score_partitions, range
+        partitioned on score, which then has to be part of the primary key
+        """
+        partitioned = self.settings.db.score_partitions > 0
+        table_args = (
+            {"postgresql_partition_by": "RANGE (score)"} if partitioned else {}
+        )
+        # columns are ordered by creation, score first
+        score = Column(Float, primary_key=partitioned, index=not partitioned)
+        pair_columns = self.pair_columns()
+        table = type(
             "scores",
             (self.Base,),
             {
                 "__tablename__": "scores",
-                "score": Column(Float),
-                "_index_l": Column(Integer, primary_key=True),
-                "_index_r": Column(Integer, primary_key=True),
+                "score": score,
+                **pair_columns,
+                "__table_args__": (
+                    *pair_columns.get("__table_args__", ()),
+                    table_args,
+                ),
             },
         )
+        if partitioned:
+            event.listen(
+                table.__table__, "after_create", self.score_partitions_ddl()
+            )
+        return table
+
+    def score_partitions_ddl(self) -> DDL:
+        """
+        creates the score partitions of scores: equal-width buckets between
+        SettingsModel.min_score and 1, the first and last of them unbounded
+        """
+        n = self.settings.db.score_partitions
+        lower = self.settings.model.min_score
+        bounds = (
+            ["MINVALUE"]
+            + [f"{lower + (1 - lower) * i / n:.6g}" for i in range(1, n)]
+            + ["MAXVALUE"]
+        )
+        schema = self.settings.db.db_schema
+        return DDL(
+            "".join(
+                f"""
+                CREATE TABLE {schema}.scores_{i} PARTITION OF {schema}.scores
+                FOR VALUES FROM ({bounds[i]}) TO ({bounds[i + 1]});
+                """
+                for i in range(n)
+            )
+        )
 
     def delete_schema(self):
         logging.info("drop schema %s if not exists", self.settings.db.db_schema)
@@ -344,12 +421,18 @@ class Tables(TablesRecordLinkage):
 
     def bulk_insert(self, df: pd.DataFrame, to_table: TABLE) -> None:
         """
-        helper function to insert data from df to table;
+        helper function to insert data from df to table with COPY;
+        columns of df that are not in the table are ignored;
         fails if there are key conflicts
         """
-        with self.Session() as session:
-            session.bulk_insert_mappings(to_table, df.to_dict(orient="records"))
-            session.commit()
+        columns = [c for c in df.columns if c in to_table.__table__.columns]
+        copy_from(
+            engine=self.engine,
+            data=df[columns],
+            table=to_table.__tablename__,
+            schema=self.settings.db.db_schema,
+            chunksize=self.settings.db.chunksize,
+        )
 
     def reset_all_tables(self):
         """deletes all tables and creates all tables"""
@@ -0,0 +1,351 @@
+"""This module contains vectorized, in-process string comparators used to
+compute distance features.
+
+Each comparator takes two arrays of strings of the same length and
+returns the similarity of each pair as a float array in [0, 1]; a pair
+with a null value has a null (NaN) similarity. Strings are laid out as
+fixed-width arrays of code points so that every comparison is a batched
+NumPy operation over all pairs, rather than a call per pair.
+"""
+
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from oagdedupe.block.pairsets import isin_sorted
+from oagdedupe.block.signatures import find_ngrams
+
+# upper bound on the number of cells of the (pairs x len_a x len_b)
+# arrays built at once
+MAX_CELLS = 2**24
+
+
+def _codes(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    code points of each string, padded with 0 to the longest string, and
+    the length of each string
+    """
+    values = values.astype(str)
+    lengths = np.char.str_len(values) if len(values) else np.zeros(0, int)
+    width = max(int(lengths.max()) if len(values) else 0, 1)
+    codes = values.astype(f"<U{width}").view(np.uint32).reshape(len(values), -1)
+    return codes, lengths
+
+
+def _pairwise(
+    func, a: np.ndarray, b: np.ndarray, batch_size: int = None
+) -> np.ndarray:
+    """
+    applies a comparator to non-null pairs, in batches small enough to
+    keep the arrays it builds under MAX_CELLS
+
+    Unless batch_size is given, pairs are grouped into buckets of similar
+    width (the longer string of the pair, up to a power of two), and each
+    bucket is batched by its own width, so that a few long strings do not
+    shrink the batches of all others.
+    """
+    a = np.asarray(a, dtype=object)
+    b = np.asarray(b, dtype=object)
+    out = np.full(len(a), np.nan)
+    valid = ~(pd.isnull(a) | pd.isnull(b))
+    idx = np.flatnonzero(valid)
+    if len(idx) == 0:
+        return out
+    if batch_size is not None:
+        buckets = [(idx, batch_size)]
+    else:
+        widths = np.maximum(
+            pd.Series(a[idx]).astype(str).str.len().to_numpy(),
+            pd.Series(b[idx]).astype(str).str.len().to_numpy(),
+        )
+        exponents = np.ceil(np.log2(np.maximum(widths, 1))).astype(int)
+        buckets = []
+        for exponent in np.unique(exponents):
+            bucket = exponents == exponent
+            width = max(int(widths[bucket].max()), 1)
+            buckets.append((idx[bucket], max(1, MAX_CELLS // (width * width))))
+    for rows, size in buckets:
+        for start in range(0, len(rows), size):
+            batch = rows[start : start + size]
+            out[batch] = func(a[batch], b[batch])
+    return out
+
+
+def _jaro_winkler(
+    a: np.ndarray, b: np.ndarray, prefix_scale: float = 0.1
+) -> np.ndarray:
+    codes_a, len_a = _codes(a)
+    codes_b, len_b = _codes(b)
+    n, width_a = codes_a.shape
+    width_b = codes_b.shape[1]
+    rows = np.arange(n)
+
+    # characters match if equal and no further apart than the window
+    window = np.maximum(np.maximum(len_a, len_b) // 2 - 1, 0)
+    pos_a = np.arange(width_a)[None, :, None]
+    pos_b = np.arange(width_b)[None, None, :]
+    candidates = (
+        (codes_a[:, :, None] == codes_b[:, None, :])
+        & (np.abs(pos_a - pos_b) <= window[:, None, None])
+        & (pos_a < len_a[:, None, None])
+        & (pos_b < len_b[:, None, None])
+    )
+
+    # each character of a takes the first unmatched match in b
+    matched_a = np.zeros((n, width_a), dtype=bool)
+    matched_b = np.zeros((n, width_b), dtype=bool)
+    for i in range(width_a):
+        free = candidates[:, i, :] & ~matched_b
+        found = free.any(axis=1)
+        j = free.argmax(axis=1)
+        matched_a[found, i] = True
+        matched_b[rows[found], j[found]] = True
+
+    m = matched_a.sum(axis=1)
+    # matched characters in order of appearance, compared position-wise
+    order_a = np.argsort(~matched_a, axis=1, kind="stable")
+    order_b = np.argsort(~matched_b, axis=1, kind="stable")
+    width = min(width_a, width_b)
+    seq_a = np.take_along_axis(codes_a, order_a, axis=1)[:, :width]
+    seq_b = np.take_along_axis(codes_b, order_b, axis=1)[:, :width]
+    in_match = np.arange(width)[None, :] < m[:, None]
+    transpositions = ((seq_a != seq_b) & in_match).sum(axis=1) / 2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        jaro = np.where(
+            m > 0,
+            (m / len_a + m / len_b + (m - transpositions) / m) / 3,
+            0.0,
+        )
+
+    n_prefix = min(4, width)
+    same = codes_a[:, :n_prefix] == codes_b[:, :n_prefix]
+    same &= np.arange(n_prefix)[None, :] < np.minimum(len_a, len_b)[:, None]
+    prefix = np.cumprod(same, axis=1).sum(axis=1)
+    res = jaro + prefix * prefix_scale * (1 - jaro)
+    return np.where((len_a == 0) & (len_b == 0), 1.0, res)
+
+
+def jaro_winkler(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Jaro-Winkler similarity: Jaro similarity boosted by the length of the
+    common prefix, up to 4 characters, with a prefix scale of 0.1
+
+    Parameters
+    ----------
+    a: np.ndarray
+        strings
+    b: np.ndarray
+        strings to compare a to, element-wise
+
+    Returns
+    ----------
+    np.ndarray
+        similarities
+    """
+    return _pairwise(_jaro_winkler, a, b)
+
+
+def _levenshtein_ratio(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    codes_a, len_a = _codes(a)
+    codes_b, len_b = _codes(b)
+    n, width_a = codes_a.shape
+    width_b = codes_b.shape[1]
+
+    # edit distance table, one anti-diagonal i + j = d at a time, indexed
+    # by i: every cell of a diagonal only depends on the previous two
+    i = np.arange(width_a + 1)
+    prev2 = np.zeros((n, width_a + 1), dtype=np.int64)
+    prev1 = np.zeros((n, width_a + 1), dtype=np.int64)
+    dist = np.zeros(n, dtype=np.int64)
+    for d in range(width_a + width_b + 1):
+        cur = np.zeros((n, width_a + 1), dtype=np.int64)
+        if d <= width_b:
+            cur[:, 0] = d
+        if d <= width_a:
+            cur[:, d] = d
+        j = d - i
+        inner = (i >= 1) & (j >= 1) & (j <= width_b)
+        ii, jj = i[inner], j[inner]
+        if len(ii):
+            cost = codes_a[:, ii - 1] != codes_b[:, jj - 1]
+            cur[:, ii] = np.minimum(
+                np.minimum(prev1[:, ii - 1], prev1[:, ii]) + 1,
+                prev2[:, ii - 1] + cost,
+            )
+        done = len_a + len_b == d
+        dist[done] = cur[done, len_a[done]]
+        prev2, prev1 = prev1, cur
+
+    longest = np.maximum(len_a, len_b)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(longest > 0, 1 - dist / longest, 1.0)
+
+
+def levenshtein_ratio(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    1 - the Levenshtein edit distance divided by the length of the longer
+    string
+
+    Parameters
+    ----------
+    a: np.ndarray
+        strings
+    b: np.ndarray
+        strings to compare a to, element-wise
+
+    Returns
+    ----------
+    np.ndarray
+        similarities
+    """
+    return _pairwise(_levenshtein_ratio, a, b)
+
+
+def _multiset_keys(
+    items: List[list], vocabulary: pd.Index
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (row, item) keys of lists of items, with the number of times each item
+    appears in its row
+    """
+    lengths = np.fromiter((len(x) for x in items), dtype=np.int64)
+    flat = [x for row in items for x in row]
+    rows = np.repeat(np.arange(len(items)), lengths)
+    keys = rows * len(vocabulary) + vocabulary.get_indexer(flat)
+    return np.unique(keys, return_counts=True)
+
+
+def _vocabulary(*items: List[list]) -> pd.Index:
+    return pd.Index(
+        pd.unique(
+            np.array([x for lists in items for row in lists for x in row])
+        )
+    )
+
+
+def _token_jaccard(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    tokens_a = [set(str(x).split()) for x in a]
+    tokens_b = [set(str(x).split()) for x in b]
+    vocabulary = _vocabulary(tokens_a, tokens_b)
+    keys_a, _ = _multiset_keys([list(x) for x in tokens_a], vocabulary)
+    keys_b, _ = _multiset_keys([list(x) for x in tokens_b], vocabulary)
+    shared = keys_a[isin_sorted(keys_a, keys_b)]
+
+    n = len(a)
+    size = max(len(vocabulary), 1)
+    intersection = np.bincount(shared // size, minlength=n)
+    union = (
+        np.bincount(keys_a // size, minlength=n)
+        + np.bincount(keys_b // size, minlength=n)
+        - intersection
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(union > 0, intersection / union, 1.0)
+
+
+def token_jaccard(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Jaccard similarity of the sets of whitespace-separated tokens
+
+    Parameters
+    ----------
+    a: np.ndarray
+        strings
+    b: np.ndarray
+        strings to compare a to, element-wise
+
+    Returns
+    ----------
+    np.ndarray
+        similarities
+    """
+    return _pairwise(_token_jaccard, a, b, batch_size=MAX_CELLS)
+
+
+def _ngram_cosine(a: np.ndarray, b: np.ndarray, n: int = 3) -> np.ndarray:
+    grams_a = find_ngrams(pd.Series(a, dtype=object), n).tolist()
+    grams_b = find_ngrams(pd.Series(b, dtype=object), n).tolist()
+    vocabulary = _vocabulary(grams_a, grams_b)
+    keys_a, counts_a = _multiset_keys(grams_a, vocabulary)
+    keys_b, counts_b = _multiset_keys(grams_b, vocabulary)
+
+    rows = len(a)
+    size = max(len(vocabulary), 1)
+    shared = isin_sorted(keys_a, keys_b)
+    dot = np.bincount(
+        keys_a[shared] // size,
+        weights=counts_a[shared]
+        * counts_b[np.searchsorted(keys_b, keys_a[shared])],
+        minlength=rows,
+    )
+    norm_a = np.sqrt(np.bincount(keys_a // size, counts_a**2, minlength=rows))
+    norm_b = np.sqrt(np.bincount(keys_b // size, counts_b**2, minlength=rows))
+    # strings shorter than n have no n-grams; they are only similar to
+    # themselves
+    empty = (norm_a == 0) | (norm_b == 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(
+            empty,
+            (a.astype(str) == b.astype(str)).astype(float),
+            dot / (norm_a * norm_b),
+        )
+
+
+def ngram_cosine(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    cosine similarity of the character trigram count vectors
+
+    Parameters
+    ----------
+    a: np.ndarray
+        strings
+    b: np.ndarray
+        strings to compare a to, element-wise
+
+    Returns
+    ----------
+    np.ndarray
+        similarities
+    """
+    return _pairwise(_ngram_cosine, a, b, batch_size=MAX_CELLS)
+
+
+COMPARATORS = {
+    "jarowinkler": jaro_winkler,
+    "levenshtein": levenshtein_ratio,
+    "jaccard": token_jaccard,
+    "cosine": ngram_cosine,
+}
+
+
+def compute_distances(
+    df: pd.DataFrame, attributes: List[str], comparators: Dict[str, str]
+) -> pd.DataFrame:
+    """
+    Computes distance features for a batch of pairs.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        pairs: _index_l, _index_r and the "_l" and "_r" attribute columns
+    attributes: List[str]
+        entity attribute names
+    comparators: Dict[str, str]
+        comparator name of each attribute (see COMPARATORS); attributes
+        not listed are compared with "jarowinkler"
+
+    Returns
+    ----------
+    pd.DataFrame
+        _index_l, _index_r and one distance column per attribute
+    """
+    out = {"_index_l": df["_index_l"], "_index_r": df["_index_r"]}
+    for attr in attributes:
+        comparator = COMPARATORS[comparators.get(attr, "jarowinkler")]
+        out[attr] = comparator(
+            df[f"{attr}_l"].to_numpy(dtype=object),
+            df[f"{attr}_r"].to_numpy(dtype=object),
+        )
+    return pd.DataFrame(out)
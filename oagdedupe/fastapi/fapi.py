@@ -110,7 +110,8 @@ class TasksPost(SettingsEnabler):
             n_instances=n_instances,
         )
 
-        return distances.loc[sample_idx, self.settings.compare_cols]
+        samples = self.api.repo.with_attributes(distances.loc[sample_idx])
+        return samples[self.settings.compare_cols]
 
     def _post_tasks(self) -> None:
         """
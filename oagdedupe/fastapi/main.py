@@ -11,10 +11,12 @@ import joblib
 import numpy as np
 import pandas as pd
 import uvicorn
+from fastapi import HTTPException, Request, Response
 from sqlalchemy import types
 from tqdm import tqdm
 
-from oagdedupe._typing import Dists
+from oagdedupe._typing import (ARRAY_MEDIA_TYPE, Dists, array_from_bytes,
+                               array_to_bytes, media_type)
 from oagdedupe.fastapi import app, fapi
 from oagdedupe.labelstudio import lsapi
 from oagdedupe.settings import Settings
@@ -73,6 +75,35 @@ async def predict(dists: Dists) -> Dists:
     return res.tolist()
 
 
+@app.post(
+    "/predict/array",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {ARRAY_MEDIA_TYPE: {"schema": {"type": "string"}}},
+        }
+    },
+)
+async def predict_array(request: Request) -> Response:
+    """
+    predicted probabilities of match for a batch of distances sent as a
+    binary float32 array (ARRAY_MEDIA_TYPE) of the distance columns only;
+    the response is encoded the same way
+    """
+    if media_type(request.headers.get("content-type")) != ARRAY_MEDIA_TYPE:
+        raise HTTPException(
+            status_code=415, detail=f"expected {ARRAY_MEDIA_TYPE}"
+        )
+    try:
+        dists = array_from_bytes(
+            await request.body(), n_cols=len(settings.attributes)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    res = m.clf.predict_proba(dists)
+    return Response(array_to_bytes(res), media_type=ARRAY_MEDIA_TYPE)
+
+
 @app.post("/payload")
 async def payload() -> None:
     logging.info("received request for new samples from labelstudio")
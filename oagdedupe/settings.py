@@ -4,7 +4,7 @@
 # import os
 import logging
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, BaseSettings
 
@@ -47,12 +47,49 @@ class SettingsModel(BaseModel):
     """maximum number of comparisons"""
     n_covered: int = 500_000
 
+    """largest block, in number of entities, that generates pairs; larger
+    blocks (e.g. a very common first_nchars_2 value) are pruned"""
+    max_block_size: Optional[int] = None
+
+    """percentile (0-100) of each scheme's block sizes above which blocks
+    are pruned; combined with max_block_size, the smaller limit applies"""
+    max_block_percentile: Optional[float] = None
+
+    """build the forward index on full data for all schemes used by the
+    learned conjunctions in a single scan, instead of one conjunction
+    at a time"""
+    single_scan: bool = False
+
+    """draw a new unlabelled sample every active learning iteration; if
+    False, the sample is kept and conjunction stats persisted by the last
+    iteration are reused, with only their label coverage recounted"""
+    resample: bool = True
+
     """number of cpus to use"""
     cpus: int = 1
 
+    """seconds a worker waits for the stats of a conjunction that another
+    worker is computing before computing them itself; None waits until
+    they are computed"""
+    stats_wait_timeout: Optional[float] = None
+
+    """comparator used to compute the distance of each attribute, one of
+    oagdedupe.distance.comparators.COMPARATORS; attributes not listed use
+    "jarowinkler" (only the "numpy" distance engine supports others)"""
+    comparators: Dict[str, str] = {}
+
     """path to model"""
     path_model: Path = Path("./.dedupe/model")
 
+    """how full comparisons are scored: "http" posts distances to the
+    fastapi /predict endpoint, e.g. for a remote model; "local" loads the
+    model from path_model and scores in-process"""
+    scoring_engine: str = "http"
+
+    """pairs scoring below this are not stored in the scores table, so
+    clusters can only be extracted at thresholds at or above it"""
+    min_score: float = 0.0
+
 
 class SettingsDB(BaseModel):
     """Other project settings"""
@@ -65,6 +102,46 @@ class SettingsDB(BaseModel):
     """database schema"""
     db_schema: str = "dedupe"
 
+    """engine used to compute block scheme signatures: "udf" calls the
+    plpython3u functions in postgres; "pandas" computes them in-process"""
+    signature_engine: str = "udf"
+
+    """engine used to compute conjunction stats on the train sample: "sql"
+    self-joins inverted indices in postgres for every conjunction; "memory"
+    loads the pair set of each scheme once and intersects them in-process"""
+    stats_engine: str = "sql"
+
+    """number of rows per batch when streaming data in or out of postgres"""
+    chunksize: int = 50_000
+
+    """number of connections kept open by each process's engine"""
+    pool_size: int = 5
+
+    """number of connections each engine may open beyond pool_size"""
+    max_overflow: int = 10
+
+    """whether pair tables (labels, comparisons, full_comparisons, scores)
+    are keyed by a single BIGINT _pair_key, pair_key(_index_l, _index_r),
+    instead of the composite (_index_l, _index_r)"""
+    pair_key: bool = False
+
+    """whether comparisons and full_comparisons hold only pair indices and
+    distances; attribute text is then joined in from df (or train) when
+    distances are computed, and only for the pairs sent to labelling"""
+    normalize_comparisons: bool = False
+
+    """engine used to compute attribute distances: "rows" calls the
+    distance function for every pair; "distinct" calls it once per distinct
+    pair of attribute values and joins the results back; "numpy" streams
+    pairs out of postgres and computes distances in worker processes"""
+    distance_engine: str = "rows"
+
+    """if positive, the scores table is range-partitioned on score into
+    this many equal-width buckets between SettingsModel.min_score and 1,
+    so reading the scores above a threshold skips lower buckets; if 0, it
+    is a single table indexed on score"""
+    score_partitions: int = 0
+
     @property
     def db(self):
         return self.path_database.split("+")[0]
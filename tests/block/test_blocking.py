@@ -0,0 +1,167 @@
+import unittest
+from dataclasses import dataclass, field
+from typing import List
+
+import pytest
+
+from oagdedupe._typing import StatsDict
+from oagdedupe.block.blocking import Blocking
+
+
+@pytest.fixture
+def conjunctions():
+    return [
+        StatsDict(
+            n_pairs=10,
+            conjunction=("exactmatch_name", "first_nchars_2_addr"),
+            rr=0.999,
+            positives=100,
+            negatives=1,
+        ),
+        StatsDict(
+            n_pairs=10,
+            conjunction=("exactmatch_name", "acronym_addr"),
+            rr=0.998,
+            positives=100,
+            negatives=1,
+        ),
+        StatsDict(
+            n_pairs=10,
+            conjunction=("exactmatch_addr",),
+            rr=0.5,
+            positives=100,
+            negatives=1,
+        ),
+    ]
+
+
+@dataclass
+class FakeRepo:
+    settings: object
+    min_rr: float = 0.9
+    n_pairs: int = 0
+    estimates: dict = field(default_factory=dict)
+    n_pairs_queries: int = 0
+
+    def get_n_pairs(self, table):
+        self.n_pairs_queries += 1
+        return self.n_pairs
+
+    def estimate_stats(self, conjunction, table):
+        return StatsDict(
+            n_pairs=self.estimates.get(conjunction, 10),
+            conjunction=conjunction,
+            rr=0.999,
+            positives=0,
+            negatives=0,
+        )
+
+
+@dataclass
+class FakeForward:
+    repo: FakeRepo
+    settings: object
+    calls: List[tuple] = field(default_factory=list)
+
+    def build_forward_indices(self, full=False, conjunction=None):
+        self.calls.append(conjunction)
+
+
+@dataclass
+class FakePairs:
+    repo: FakeRepo
+    settings: object
+
+    def add_new_comparisons(self, stats, table, budget=None):
+        n_pairs = (
+            stats.n_pairs if budget is None else min(stats.n_pairs, budget)
+        )
+        self.repo.n_pairs += n_pairs
+        return n_pairs
+
+
+@dataclass
+class FakeOptimizer:
+    repo: FakeRepo
+    settings: object
+
+
+class TestBlocking(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def prepare_fixtures(self, settings, conjunctions):
+        self.settings = settings.copy(deep=True)
+        self.conjunctions = conjunctions
+
+    def blocking(self, single_scan):
+        self.settings.model.single_scan = single_scan
+        blocking = Blocking(
+            repo=FakeRepo(settings=self.settings),
+            conj=lambda settings, optimizer: None,
+            forward=FakeForward,
+            pairs=FakePairs,
+            optimizer=FakeOptimizer,
+        )
+        blocking.forward.repo = blocking.repo
+        blocking.pairs.repo = blocking.repo
+        blocking.conj = type(
+            "FakeConjunctions",
+            (),
+            {"conjunctions_list": self.conjunctions},
+        )
+        return blocking
+
+    def test_conjunction_schemes(self):
+        self.assertEqual(
+            self.blocking(single_scan=True).conjunction_schemes,
+            ("exactmatch_name", "first_nchars_2_addr", "acronym_addr"),
+        )
+
+    def test_save_comparisons_per_conjunction(self):
+        blocking = self.blocking(single_scan=False)
+        blocking.save_comparisons(table="blocks_df", n_covered=100)
+        self.assertEqual(
+            blocking.forward.calls,
+            [c.conjunction for c in self.conjunctions[:2]],
+        )
+
+    def test_save_comparisons_single_scan(self):
+        blocking = self.blocking(single_scan=True)
+        blocking.save_comparisons(table="blocks_df", n_covered=100)
+        self.assertEqual(
+            blocking.forward.calls,
+            [("exactmatch_name", "first_nchars_2_addr", "acronym_addr")],
+        )
+        self.assertEqual(blocking.repo.n_pairs, 20)
+        self.assertEqual(blocking.repo.n_pairs_queries, 1)
+
+    def test_save_comparisons_skips_exact_over_max_compare(self):
+        self.conjunctions.insert(
+            0,
+            StatsDict(
+                n_pairs=10,
+                conjunction=("exactmatch_name",),
+                rr=0.999,
+                positives=100,
+                negatives=1,
+            ),
+        )
+        blocking = self.blocking(single_scan=False)
+        blocking.repo.estimates[("exactmatch_name",)] = (
+            self.settings.model.max_compare + 1
+        )
+        blocking.save_comparisons(table="blocks_df", n_covered=100)
+        self.assertEqual(blocking.repo.n_pairs, 20)
+
+    def test_save_comparisons_keeps_estimated_conjunctions(self):
+        blocking = self.blocking(single_scan=False)
+        blocking.repo.estimates[self.conjunctions[0].conjunction] = (
+            self.settings.model.max_compare + 1
+        )
+        blocking.save_comparisons(table="blocks_df", n_covered=100)
+        self.assertEqual(blocking.repo.n_pairs, 20)
+
+    def test_save_comparisons_stops_at_budget(self):
+        blocking = self.blocking(single_scan=False)
+        blocking.save_comparisons(table="blocks_df", n_covered=15)
+        self.assertEqual(blocking.repo.n_pairs, 15)
+        self.assertEqual(len(blocking.forward.calls), 2)
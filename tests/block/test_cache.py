@@ -0,0 +1,68 @@
+import time
+import unittest
+from functools import partial
+from multiprocessing import Manager, Pool
+
+import pytest
+
+from oagdedupe._typing import StatsDict
+from oagdedupe.block.cache import StatsCache
+
+
+def compute(conjunction, calls):
+    calls.append(conjunction)
+    time.sleep(0.05)
+    return StatsDict(
+        n_pairs=10,
+        conjunction=conjunction,
+        rr=0.999,
+        positives=100,
+        negatives=1,
+    )
+
+
+def get(conjunction, cache, calls):
+    return cache.get(conjunction, compute=partial(compute, conjunction, calls))
+
+
+class TestStatsCache(unittest.TestCase):
+    def setUp(self):
+        self.manager = Manager()
+        self.cache = StatsCache.create(self.manager)
+        self.calls = self.manager.list()
+
+    def tearDown(self):
+        self.manager.shutdown()
+
+    def test_get(self):
+        for _ in range(3):
+            res = get(("scheme",), self.cache, self.calls)
+        self.assertEqual(res.conjunction, ("scheme",))
+        self.assertEqual(list(self.calls), [("scheme",)])
+        self.assertEqual(self.cache.info(), {"hits": 2, "misses": 1})
+
+    def test_get_shared_across_workers(self):
+        with Pool(4) as p:
+            res = p.map(
+                partial(get, cache=self.cache, calls=self.calls),
+                [("scheme1",), ("scheme2",)] * 4,
+            )
+        self.assertEqual(len(res), 8)
+        self.assertEqual(sorted(self.calls), [("scheme1",), ("scheme2",)])
+        self.assertEqual(self.cache.info(), {"hits": 6, "misses": 2})
+
+    def test_failed_compute_releases_claim(self):
+        def fail():
+            raise ValueError
+
+        with pytest.raises(ValueError):
+            self.cache.get(("scheme",), compute=fail)
+        get(("scheme",), self.cache, self.calls)
+        self.assertEqual(list(self.calls), [("scheme",)])
+
+    def test_pending_timeout_computes_locally(self):
+        cache = StatsCache.create(self.manager, timeout=0.1)
+        cache.stats[("scheme",)] = "pending"
+        res = get(("scheme",), cache, self.calls)
+        self.assertEqual(res.conjunction, ("scheme",))
+        self.assertEqual(list(self.calls), [("scheme",)])
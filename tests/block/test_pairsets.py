@@ -0,0 +1,81 @@
+import itertools
+import unittest
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from oagdedupe.block.pairsets import (PairSets, block_pairs, isin_sorted,
+                                      pair_keys)
+
+
+@pytest.fixture
+def blocks():
+    return {
+        "scheme1": [[-3, -1, 0], [1, 2], [5]],
+        "scheme2": [[-3, 0, 1, 2], [-1, 5]],
+    }
+
+
+@pytest.fixture
+def labels():
+    return pd.DataFrame(
+        {
+            "_index_l": [-3, -3, 1, -1],
+            "_index_r": [0, -1, 2, 5],
+            "label": [1, 1, 0, 2],
+        }
+    )
+
+
+def brute_force(blocks):
+    return {
+        (left, right)
+        for block in blocks
+        for left, right in itertools.combinations(sorted(block), 2)
+    }
+
+
+class TestPairSets(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def prepare_fixtures(self, blocks, labels):
+        self.blocks = blocks
+        self.labels = labels
+
+    def test_pair_keys_unique(self):
+        l, r = np.meshgrid(np.arange(-3, 3), np.arange(-3, 3))
+        keys = pair_keys(l.ravel(), r.ravel())
+        self.assertEqual(len(np.unique(keys)), 36)
+
+    def test_isin_sorted(self):
+        res = isin_sorted(np.array([1, 4, 9]), np.array([1, 2, 4]))
+        self.assertEqual(res.tolist(), [True, True, False])
+
+    def test_block_pairs(self):
+        expected = brute_force(self.blocks["scheme1"])
+        keys = block_pairs(self.blocks["scheme1"])
+        self.assertEqual(len(keys), len(expected))
+        self.assertEqual(
+            keys.tolist(),
+            sorted(pair_keys(*zip(*expected)).tolist()),
+        )
+
+    def test_block_pairs_link(self):
+        keys = block_pairs([[1, 2], [3]], [[7], [8, 9]])
+        self.assertEqual(
+            set(keys.tolist()),
+            set(pair_keys([1, 2, 3, 3], [7, 7, 8, 9]).tolist()),
+        )
+
+    def test_stats(self):
+        pairsets = PairSets(
+            keys={s: block_pairs(b) for s, b in self.blocks.items()},
+            labels=self.labels,
+        )
+        expected = brute_force(self.blocks["scheme1"]) & brute_force(
+            self.blocks["scheme2"]
+        )
+        n_pairs, positives, negatives = pairsets.stats(("scheme1", "scheme2"))
+        self.assertEqual(n_pairs, len(expected))
+        self.assertEqual(positives, 1)
+        self.assertEqual(negatives, 1)
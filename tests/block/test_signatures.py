@@ -0,0 +1,73 @@
+import unittest
+
+import pandas as pd
+import pytest
+
+from oagdedupe.block import signatures
+
+# reference implementations, copied from the plpython3u functions in
+# oagdedupe.db.postgres.funcs
+udfs = {
+    "first_nchars": lambda s, n: s[:n],
+    "last_nchars": lambda s, n: s[-n:],
+    "find_ngrams": lambda s, n: [s[i : i + n] for i in range(len(s) - n + 1)],
+    "acronym": lambda s: "".join(e[0] for e in s.split()),
+    "exactmatch": lambda s: s,
+}
+
+
+@pytest.fixture(scope="module")
+def values():
+    return pd.Series(
+        [
+            "Jack Johnson",
+            "Elvis Presley",
+            "ab",
+            "",
+            "  leading and  double spaces ",
+            "123 Main St. Apt #4",
+            "ÉLODIE Ōtsuka",
+        ]
+    )
+
+
+class TestSignatures(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def prepare_fixtures(self, settings, values):
+        self.settings = settings
+        self.values = values
+
+    def test_matches_udfs(self):
+        for scheme, nlist in signatures.Signatures(
+            settings=self.settings
+        ).block_schemes:
+            for n in nlist:
+                args = (n,) if n else ()
+                res = signatures.SCHEMES[scheme](self.values, *args)
+                expected = [udfs[scheme](x, *args) for x in self.values]
+                self.assertEqual(res.tolist(), expected)
+
+    def test_nulls_stay_null(self):
+        res = signatures.find_ngrams(pd.Series(["abcd", None]), 4)
+        self.assertEqual(res.tolist(), [["abcd"], None])
+
+    def test_ngrams_mixed_lengths(self):
+        values = pd.Series(["abc", "x" * 1000, "abcdefghij", None, "ab"])
+        res = signatures.find_ngrams(values, 3)
+        expected = [
+            None if x is None else udfs["find_ngrams"](x, 3) for x in values
+        ]
+        self.assertEqual(res.tolist(), expected)
+
+    def test_compute(self):
+        df = pd.DataFrame(
+            {"_index": [3, 7], "name": ["Jack", "Jill"], "addr": ["a", "b"]}
+        )
+        res = signatures.Signatures(settings=self.settings).compute(
+            df, schemes=["first_nchars_2_name", "exactmatch_addr"]
+        )
+        self.assertEqual(
+            list(res.columns),
+            ["_index", "first_nchars_2_name", "exactmatch_addr"],
+        )
+        self.assertEqual(res["first_nchars_2_name"].tolist(), ["Ja", "Ji"])
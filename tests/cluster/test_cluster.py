@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from oagdedupe.cluster.cluster import (
+    ConnectedComponents,
+    SparseConnectedComponents,
+)
+
+
+@pytest.fixture(scope="module")
+def scores():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "_index_l": rng.integers(1, 300, 200),
+            "_index_r": rng.integers(1, 300, 200),
+            "score": rng.random(200),
+        }
+    )
+
+
+def partition(clusters: pd.DataFrame) -> set:
+    """clusters as a set of sets of (_index, _type), ignoring cluster ids"""
+    clusters = clusters.assign(_index=clusters["_index"].astype(int))
+    return {
+        frozenset(zip(group["_index"], group["_type"]))
+        for _, group in clusters.groupby("cluster")
+    }
+
+
+class TestSparseConnectedComponents(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def prepare_fixtures(self, settings, scores):
+        self.scores = scores
+        self.graph = ConnectedComponents(repo=None, settings=settings)
+        self.sparse = SparseConnectedComponents(repo=None, settings=settings)
+
+    def test_get_connected_components(self):
+        res = self.sparse.get_connected_components(self.scores)
+        self.assertEqual(
+            partition(res),
+            partition(self.graph.get_connected_components(self.scores)),
+        )
+        self.assertEqual(len(res), res["_index"].nunique())
+
+    def test_get_connected_components_link(self):
+        res = self.sparse.get_connected_components_link(self.scores)
+        self.assertEqual(
+            partition(res),
+            partition(self.graph.get_connected_components_link(self.scores)),
+        )
+        self.assertEqual(res["_type"].sum(), self.scores["_index_l"].nunique())
+
+    def test_empty(self):
+        res = self.sparse.get_connected_components(self.scores.iloc[:0])
+        self.assertEqual(len(res), 0)
@@ -0,0 +1,350 @@
+""" integration testing postgres blocking repository
+"""
+import unittest
+
+import pandas as pd
+import pytest
+from faker import Faker
+
+from oagdedupe.block.pairsets import pair_keys
+from oagdedupe.db.postgres.blocking import (
+    PostgresBlockingRepository, PostgresMemoryBlockingRepository)
+from oagdedupe.db.postgres.initialize import InitializeRepository
+
+
+@pytest.fixture(scope="module")
+def df():
+    fake = Faker()
+    fake.seed_instance(0)
+    return pd.DataFrame(
+        {
+            "name": [fake.name() for x in range(100)],
+            "addr": [fake.address() for x in range(100)],
+        }
+    )
+
+
+class TestBlockingRepository(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def prepare_fixtures(self, settings, df):
+        self.settings = settings.copy(deep=True)
+        self.settings.model.dedupe = True
+        self.df = df
+
+    def setUp(self):
+        self.init = InitializeRepository(settings=self.settings)
+        self.init.setup(df=self.df, df2=None)
+        self.repo = PostgresBlockingRepository(settings=self.settings)
+        self.repo.build_forward_indices(full=False)
+        return
+
+    def test_build_inverted_indices(self):
+        df = self.repo.query(
+            f"""
+            SELECT * FROM {self.settings.db.db_schema}.inv_train_exactmatch_name
+            """
+        )
+        self.assertEqual(list(df["block_size"]), list(df["_indices"].map(len)))
+        n_train = self.repo.query(
+            f"SELECT count(*) FROM {self.settings.db.db_schema}.train"
+        )["count"].values[0]
+        self.assertEqual(df["block_size"].sum(), n_train)
+        self.assertTrue(all(df["_indices"].map(lambda x: x == sorted(x))))
+
+    def test_get_conjunction_stats(self):
+        stats = self.repo.get_conjunction_stats(
+            conjunction=("exactmatch_name",), table="blocks_train"
+        )
+        # the 4 positive samples share the same name
+        self.assertEqual(stats.n_pairs, 6)
+        self.assertEqual(stats.positives, 6)
+
+    def test_estimate_stats(self):
+        for conjunction in [("exactmatch_name",), ("first_nchars_2_addr",)]:
+            estimate = self.repo.estimate_stats(
+                conjunction=conjunction, table="blocks_train"
+            )
+            stats = self.repo.get_conjunction_stats(
+                conjunction=conjunction, table="blocks_train"
+            )
+            self.assertEqual(estimate.n_pairs, stats.n_pairs)
+            self.assertAlmostEqual(estimate.rr, stats.rr)
+        estimate = self.repo.estimate_stats(
+            conjunction=("exactmatch_name", "first_nchars_2_addr"),
+            table="blocks_train",
+        )
+        self.assertLessEqual(estimate.n_pairs, 6)
+
+    def test_estimate_stats_after_link_rebuild(self):
+        self.settings.model.dedupe = False
+        self.init.setup(df=self.df, df2=self.df)
+        self.repo.build_forward_indices(full=False)
+        conjunction = ("exactmatch_name",)
+        self.repo.estimate_stats(conjunction=conjunction, table="blocks_train")
+        self.repo.execute(
+            f"""
+            DELETE FROM {self.settings.db.db_schema}.blocks_train_link
+            WHERE mod(_index, 2) = 0
+            """
+        )
+        self.repo.build_inverted_indices(
+            table="blocks_train_link", schemes=conjunction
+        )
+        estimate = self.repo.estimate_stats(
+            conjunction=conjunction, table="blocks_train"
+        )
+        stats = self.repo.get_conjunction_stats(
+            conjunction=conjunction, table="blocks_train"
+        )
+        self.assertAlmostEqual(estimate.n_pairs, stats.n_pairs)
+
+    def test_add_new_comparisons(self):
+        n_inserted = self.repo.add_new_comparisons(
+            conjunction=("exactmatch_name", "first_nchars_2_addr"),
+            table="blocks_train",
+        )
+        self.assertEqual(self.repo.get_n_pairs(table="blocks_train"), 6)
+        self.assertEqual(n_inserted, 6)
+        # pairs already gathered are not counted again
+        n_inserted = self.repo.add_new_comparisons(
+            conjunction=("exactmatch_name",), table="blocks_train"
+        )
+        self.assertEqual(n_inserted, 0)
+
+    def test_add_new_comparisons_in_chunks(self):
+        conjunction = ("find_ngrams_4_name",)
+        n_all = self.repo.add_new_comparisons(
+            conjunction=conjunction, table="blocks_train"
+        )
+        pairs = self.repo.query(
+            f"SELECT * FROM {self.settings.db.db_schema}.comparisons"
+        )
+        self.repo.execute(
+            f"TRUNCATE TABLE {self.settings.db.db_schema}.comparisons"
+        )
+        self.settings.db.chunksize = 5
+        blocks = self.repo.signature_pairs(conjunction[0], "blocks_train")
+        self.assertGreater(len(self.repo.signature_ranges(blocks, 5)), 1)
+        n_chunked = self.repo.add_new_comparisons(
+            conjunction=conjunction, table="blocks_train"
+        )
+        self.assertEqual(n_chunked, n_all)
+        pd.testing.assert_frame_equal(
+            self.repo.query(
+                f"""
+                SELECT * FROM {self.settings.db.db_schema}.comparisons
+                ORDER BY _index_l, _index_r
+                """
+            ),
+            pairs.sort_values(["_index_l", "_index_r"]).reset_index(drop=True),
+        )
+
+    def test_add_new_comparisons_budget(self):
+        self.settings.db.chunksize = 5
+        conjunction = ("find_ngrams_4_name",)
+        n_inserted = self.repo.add_new_comparisons(
+            conjunction=conjunction, table="blocks_train", budget=5
+        )
+        self.assertGreaterEqual(n_inserted, 5)
+        self.assertEqual(
+            self.repo.get_n_pairs(table="blocks_train"), n_inserted
+        )
+        # the remaining chunks are added later
+        n_rest = self.repo.add_new_comparisons(
+            conjunction=conjunction, table="blocks_train"
+        )
+        self.assertGreater(n_rest, 0)
+
+    def test_add_new_comparisons_partitioned(self):
+        conjunction = ("first_nchars_2_name", "find_ngrams_4_addr")
+        self.repo.build_forward_indices(full=True, conjunction=conjunction)
+        self.settings.model.cpus = 1
+        n_serial = self.repo.add_new_comparisons(
+            conjunction=conjunction, table="blocks_df"
+        )
+        self.assertGreater(n_serial, 0)
+        pairs = self.repo.query(
+            f"""
+            SELECT * FROM {self.settings.db.db_schema}.full_comparisons
+            ORDER BY _index_l, _index_r
+            """
+        )
+        self.repo.execute(
+            f"TRUNCATE TABLE {self.settings.db.db_schema}.full_comparisons"
+        )
+        self.settings.model.cpus = 4
+        self.settings.db.chunksize = 1
+        self.assertEqual(self.repo.n_partitions("blocks_df", n_serial), 4)
+        self.assertEqual(self.repo.n_partitions("blocks_train", n_serial), 1)
+        n_parallel = self.repo.add_new_comparisons(
+            conjunction=conjunction, table="blocks_df"
+        )
+        self.assertEqual(n_parallel, n_serial)
+        pd.testing.assert_frame_equal(
+            self.repo.query(
+                f"""
+                SELECT * FROM {self.settings.db.db_schema}.full_comparisons
+                ORDER BY _index_l, _index_r
+                """
+            ),
+            pairs,
+        )
+
+    def test_pair_key(self):
+        self.settings.db.pair_key = True
+        self.init = InitializeRepository(settings=self.settings)
+        self.init.setup(df=self.df, df2=None)
+        self.repo.build_forward_indices(full=False)
+        labels = self.repo.query(
+            f"SELECT * FROM {self.settings.db.db_schema}.labels"
+        )
+        self.assertEqual(
+            list(labels["_pair_key"]),
+            list(pair_keys(labels["_index_l"], labels["_index_r"])),
+        )
+        indexes = self.repo.query(
+            f"""
+            SELECT indexdef FROM pg_indexes
+            WHERE schemaname = '{self.settings.db.db_schema}'
+            AND tablename = 'labels'
+            """
+        )["indexdef"]
+        self.assertTrue(indexes.str.contains(r"\(_index_l, _index_r\)").any())
+
+        conjunction = ("exactmatch_name",)
+        stats = self.repo.get_conjunction_stats(
+            conjunction=conjunction, table="blocks_train"
+        )
+        self.assertEqual((stats.n_pairs, stats.positives), (6, 6))
+        memory = PostgresMemoryBlockingRepository(settings=self.settings)
+        memory.build_forward_indices(full=False)
+        self.assertEqual(
+            memory.get_conjunction_stats(
+                conjunction=conjunction, table="blocks_train"
+            ),
+            stats,
+        )
+        self.assertEqual(
+            self.repo.label_coverage()[list(conjunction)].sum().values[0], 6
+        )
+        for n_inserted in [6, 0]:
+            self.assertEqual(
+                self.repo.add_new_comparisons(
+                    conjunction=conjunction, table="blocks_train"
+                ),
+                n_inserted,
+            )
+
+    def test_resample_drops_inverted_indices(self):
+        self.init.resample()
+        df = self.repo.query(
+            f"""
+            SELECT tablename FROM pg_tables
+            WHERE schemaname = '{self.settings.db.db_schema}'
+            AND starts_with(tablename, 'inv_')
+            """
+        )
+        self.assertEqual(len(df), 0)
+
+    def test_keep_inverted_indices_without_resample(self):
+        self.settings.model.resample = False
+        tables = f"""
+            SELECT tablename FROM pg_tables
+            WHERE schemaname = '{self.settings.db.db_schema}'
+            AND starts_with(tablename, 'inv_train_')
+            """
+        before = self.repo.query(tables)
+        self.assertGreater(len(before), 0)
+        self.init.resample()
+        self.assertEqual(len(self.repo.query(tables)), len(before))
+
+    def test_memory_stats_match_sql(self):
+        memory = PostgresMemoryBlockingRepository(settings=self.settings)
+        memory.build_forward_indices(full=False)
+        for conjunction in [
+            ("exactmatch_name",),
+            ("first_nchars_2_name", "acronym_addr"),
+            ("find_ngrams_4_name", "last_nchars_2_addr"),
+        ]:
+            self.assertEqual(
+                memory.get_conjunction_stats(
+                    conjunction=conjunction, table="blocks_train"
+                ),
+                self.repo.get_conjunction_stats(
+                    conjunction=conjunction, table="blocks_train"
+                ),
+            )
+
+    def test_persisted_stats(self):
+        conjunctions = [
+            ("exactmatch_name",),
+            ("acronym_addr", "exactmatch_name"),
+        ]
+        stats = [
+            self.repo.get_conjunction_stats(conjunction=c, table="blocks_train")
+            for c in conjunctions
+        ]
+        self.repo.persist_stats(stats)
+        self.assertEqual(self.repo.get_persisted_stats(), stats)
+
+        # labels changed: pairs are reused, coverage is recounted
+        self.repo.execute(
+            f"""
+            UPDATE {self.settings.db.db_schema}.labels SET label = 0
+            WHERE _index_l = -3 AND _index_r = -2
+            """
+        )
+        persisted = self.repo.get_persisted_stats()
+        self.assertEqual(
+            persisted,
+            [
+                self.repo.get_conjunction_stats(
+                    conjunction=c, table="blocks_train"
+                )
+                for c in conjunctions
+            ],
+        )
+        self.assertEqual(persisted[0].positives, 5)
+
+        # new sample: nothing to reuse
+        self.repo.execute(
+            f"""
+            DELETE FROM {self.settings.db.db_schema}.train
+            WHERE _index = (
+                SELECT max(_index) FROM {self.settings.db.db_schema}.train
+            )
+            """
+        )
+        self.assertEqual(self.repo.get_persisted_stats(), [])
+
+    def test_max_block_size(self):
+        self.settings.model.max_block_size = 3
+        self.repo.build_forward_indices(full=False)
+        pruned = self.repo.get_pruned_blocks(table="blocks_train")
+        self.assertIn(
+            4,
+            list(
+                pruned.loc[pruned["scheme"] == "exactmatch_name", "block_size"]
+            ),
+        )
+        self.assertTrue((pruned["block_size"] > 3).all())
+
+        conjunction = ("exactmatch_name",)
+        stats = self.repo.get_conjunction_stats(
+            conjunction=conjunction, table="blocks_train"
+        )
+        self.assertEqual(stats.positives, 0)
+        memory = PostgresMemoryBlockingRepository(settings=self.settings)
+        memory.build_forward_indices(full=False)
+        self.assertEqual(
+            memory.get_conjunction_stats(
+                conjunction=conjunction, table="blocks_train"
+            ),
+            stats,
+        )
+        self.assertEqual(
+            self.repo.estimate_stats(
+                conjunction=conjunction, table="blocks_train"
+            ).n_pairs,
+            stats.n_pairs,
+        )
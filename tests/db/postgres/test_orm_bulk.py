@@ -0,0 +1,73 @@
+""" integration testing COPY bulk loads
+"""
+import unittest
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from oagdedupe.db.postgres.bulk import copy_from
+
+
+class TestCopyFrom(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def prepare_fixtures(self, engine):
+        self.engine = engine
+
+    def setUp(self):
+        self.engine.execute(
+            """
+            CREATE SCHEMA IF NOT EXISTS bulk_test;
+            DROP TABLE IF EXISTS bulk_test.rows;
+            CREATE TABLE bulk_test.rows (
+                id serial, x integer, y double precision, z text
+            );
+        """
+        )
+
+    def tearDown(self):
+        self.engine.execute("DROP SCHEMA bulk_test CASCADE")
+
+    def rows(self) -> pd.DataFrame:
+        return pd.read_sql(
+            "SELECT * FROM bulk_test.rows ORDER BY id", con=self.engine
+        )
+
+    def test_dataframe(self):
+        df = pd.DataFrame(
+            {
+                "x": [1, 2, 3, 4, 5],
+                "y": [0.5, np.nan, 1 / 3, 2.0, -1.0],
+                "z": ['a, "b"', None, "multi\nline", "", "é"],
+            }
+        )
+        n = copy_from(
+            self.engine, df, table="rows", schema="bulk_test", chunksize=2
+        )
+        self.assertEqual(n, 5)
+        res = self.rows()
+        self.assertEqual(list(res["id"]), [1, 2, 3, 4, 5])
+        self.assertEqual(list(res["x"]), list(df["x"]))
+        np.testing.assert_array_equal(res["y"], df["y"])
+        self.assertEqual(list(res["z"]), list(df["z"]))
+
+    def test_array(self):
+        arr = np.array([[1, 0.25], [2, 0.75]])
+        copy_from(
+            self.engine,
+            arr[:, 1:],
+            table="rows",
+            schema="bulk_test",
+            columns=["y"],
+        )
+        res = self.rows()
+        self.assertEqual(list(res["y"]), [0.25, 0.75])
+        self.assertTrue(res["x"].isnull().all())
+
+    def test_nullable_integers(self):
+        df = pd.DataFrame({"x": [1, np.nan, 3], "y": [0.5, 1.5, np.nan]})
+        copy_from(self.engine, df, table="rows", schema="bulk_test")
+        res = self.rows()
+        self.assertEqual(res["x"].tolist()[::2], [1, 3])
+        self.assertTrue(np.isnan(res["x"][1]))
+        np.testing.assert_array_equal(res["y"], df["y"])
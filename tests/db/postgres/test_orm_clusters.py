@@ -3,6 +3,7 @@
 import os
 import unittest
 
+import numpy as np
 import pandas as pd
 import pytest
 from faker import Faker
@@ -10,6 +11,7 @@ from sqlalchemy import create_engine, select
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import scoped_session, sessionmaker
 
+from oagdedupe.cluster.cluster import SparseConnectedComponents
 from oagdedupe.db.postgres.initialize import InitializeRepository
 from oagdedupe.db.postgres.orm import ClusterRepository
 from oagdedupe.db.postgres.tables import Tables
@@ -51,6 +53,26 @@ def seed_clusters(orm):
             session.commit()
 
 
+def seed_scores(orm):
+    rng = np.random.default_rng(0)
+    scores = pd.DataFrame(
+        {
+            "_index_l": rng.integers(1, 100, 80),
+            "_index_r": rng.integers(1, 100, 80),
+            "score": rng.random(80),
+        }
+    ).drop_duplicates(["_index_l", "_index_r"])
+    orm.bulk_insert(df=scores, to_table=orm.Scores)
+    return scores
+
+
+def partition(clusters: pd.DataFrame) -> set:
+    return {
+        frozenset(zip(group["_index"], group["_type"]))
+        for _, group in clusters.groupby("cluster")
+    }
+
+
 class TestORM(unittest.TestCase):
     @pytest.fixture(autouse=True)
     def prepare_fixtures(self, settings, session):
@@ -79,3 +101,24 @@ class TestORM(unittest.TestCase):
         dflist = self.orm.get_clusters_link()
         self.assertEqual(dflist[0]["cluster"].values[0], 3)
         self.assertEqual(dflist[1]["cluster"].values[0], 3)
+
+    def test_save_connected_components(self):
+        for dedupe in [True, False]:
+            settings = self.settings.copy(deep=True)
+            settings.model.dedupe = dedupe
+            orm = ClusterRepository(settings=settings)
+            orm.engine.execute("TRUNCATE dedupe.scores")
+            scores = seed_scores(orm=orm)
+            orm.save_connected_components(threshold=0.3)
+            clusters = pd.read_sql(
+                "SELECT cluster, _index, _type FROM dedupe.clusters",
+                con=orm.engine,
+            )
+            sparse = SparseConnectedComponents(repo=orm, settings=settings)
+            get = "get_connected_components" + ("" if dedupe else "_link")
+            expected = getattr(sparse, get)(scores[scores["score"] > 0.3])
+            self.assertEqual(partition(clusters), partition(expected))
+            self.assertEqual(
+                sorted(clusters["cluster"].unique()),
+                list(range(clusters["cluster"].nunique())),
+            )
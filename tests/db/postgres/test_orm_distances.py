@@ -3,6 +3,7 @@
 import os
 import unittest
 
+import numpy as np
 import pandas as pd
 import pytest
 from faker import Faker
@@ -10,6 +11,7 @@ from sqlalchemy import select
 
 from oagdedupe.db.postgres.initialize import InitializeRepository
 from oagdedupe.db.postgres.orm import DistanceRepository
+from oagdedupe.distance import comparators
 
 
 @pytest.fixture(scope="module")
@@ -69,3 +71,178 @@ class TestDistanceRepository(unittest.TestCase):
         self.orm.save_distances(full=False, labels=True)
         df = pd.read_sql(select(self.orm.Labels), con=self.orm.engine)
         self.assertEqual(14, len(df))
+
+    def test_save_distances_normalized(self):
+        settings = self.settings.copy(deep=True)
+        settings.db.normalize_comparisons = True
+        InitializeRepository(settings=settings).setup(df=self.df, df2=self.df2)
+        orm = DistanceRepository(settings=settings)
+        seed_distances(orm=orm)
+        orm.save_distances(full=True, labels=False)
+        df = pd.read_sql(select(orm.FullComparisons), con=orm.engine)
+        self.assertNotIn("name_l", df.columns)
+        self.assertEqual([2, 2], list(df[self.settings.attributes].sum(axis=1)))
+
+    def test_compute_distances_distinct(self):
+        def distances():
+            return pd.read_sql(
+                f"""
+                SELECT * FROM {self.settings.db.db_schema}.labels
+                ORDER BY _index_l, _index_r
+                """,
+                con=self.orm.engine,
+            )[self.settings.attributes]
+
+        self.orm.compute_distances(table=self.orm.Labels)
+        expected = distances()
+        self.orm.engine.execute(
+            f"""
+            UPDATE {self.settings.db.db_schema}.labels
+            SET name = NULL, addr = NULL, _computed = false
+            """
+        )
+        report = self.orm.compute_distances_distinct(table=self.orm.Labels)
+        pd.testing.assert_frame_equal(distances(), expected)
+        # the positive pairs share the same values
+        self.assertEqual(list(report["n_pairs"]), [14, 14])
+        self.assertTrue((report["n_distinct"] < 14).all())
+        self.assertTrue((report["ratio"] > 1).all())
+
+    def test_save_distances_distinct_report(self):
+        settings = self.settings.copy(deep=True)
+        settings.db.distance_engine = "distinct"
+        orm = DistanceRepository(settings=settings)
+        labels = pd.read_sql(select(orm.Labels), con=orm.engine)
+        report = orm.save_distances(full=False, labels=True).set_index(
+            "attribute"
+        )
+        for attr in settings.attributes:
+            n_distinct = len(
+                labels[[f"{attr}_l", f"{attr}_r"]].drop_duplicates()
+            )
+            self.assertEqual(report.loc[attr, "n_pairs"], len(labels))
+            self.assertEqual(report.loc[attr, "n_distinct"], n_distinct)
+            self.assertLess(n_distinct, len(labels))
+
+    def test_compute_distances_chunked(self):
+        settings = self.settings.copy(deep=True)
+        settings.db.chunksize = 1
+        orm = DistanceRepository(settings=settings)
+        chunks = orm.distance_chunks(table=orm.FullComparisons)
+        self.assertEqual(chunks.values.tolist(), [[1, 2], [2, 3]])
+
+        # the persisted plan is kept while the number of rows is unchanged
+        settings.db.chunksize = 100
+        chunks = orm.distance_chunks(table=orm.FullComparisons)
+        self.assertEqual(chunks.values.tolist(), [[1, 2], [2, 3]])
+
+        # interrupted after the first chunk
+        orm.engine.execute(
+            "UPDATE dedupe.distance_chunks SET done = true WHERE lower = 1"
+        )
+        orm.compute_distances_chunked(table=orm.FullComparisons)
+        df = pd.read_sql(
+            "SELECT * FROM dedupe.full_comparisons ORDER BY _index_l",
+            con=orm.engine,
+        )
+        self.assertTrue(df.loc[0, self.settings.attributes].isnull().all())
+        self.assertEqual(df.loc[1, self.settings.attributes].sum(), 2)
+        self.assertEqual(df.loc[1, "name_l"], df.loc[1, "name_r"])
+
+        # done chunks are forgotten once all are done
+        orm.save_distances(full=True, labels=False)
+        df = pd.read_sql(
+            "SELECT * FROM dedupe.full_comparisons", con=orm.engine
+        )
+        self.assertEqual(df[self.settings.attributes].sum().sum(), 4)
+        self.assertEqual(
+            len(
+                pd.read_sql("SELECT * FROM dedupe.distance_chunks", orm.engine)
+            ),
+            0,
+        )
+
+    def test_compute_distances_numpy(self):
+        settings = self.settings.copy(deep=True)
+        settings.model.cpus = 2
+        settings.model.comparators = {"addr": "levenshtein"}
+        settings.db.chunksize = 5
+        orm = DistanceRepository(settings=settings)
+        orm.compute_distances_numpy(table=orm.Labels)
+        df = pd.read_sql(select(orm.Labels), con=orm.engine)
+        np.testing.assert_allclose(
+            df["name"],
+            comparators.jaro_winkler(df["name_l"].values, df["name_r"].values),
+        )
+        np.testing.assert_allclose(
+            df["addr"],
+            comparators.levenshtein_ratio(
+                df["addr_l"].values, df["addr_r"].values
+            ),
+        )
+
+    def test_save_distances_incremental(self):
+        def labels():
+            return pd.read_sql(
+                f"""
+                SELECT * FROM {self.settings.db.db_schema}.labels
+                ORDER BY _index_l, _index_r
+                """,
+                con=self.orm.engine,
+            )
+
+        self.orm.compute_distances(table=self.orm.Labels)
+        expected = labels()[self.settings.attributes]
+        for engine in ["rows", "distinct", "numpy"]:
+            settings = self.settings.copy(deep=True)
+            settings.db.distance_engine = engine
+            settings.model.cpus = 2
+            orm = DistanceRepository(settings=settings)
+            # computed pairs are left alone, new pairs are computed
+            orm.engine.execute(
+                f"""
+                UPDATE {self.settings.db.db_schema}.labels
+                SET name = -1, addr = -1, _computed = true;
+                UPDATE {self.settings.db.db_schema}.labels
+                SET name = NULL, addr = NULL, _computed = false
+                WHERE label = 1;
+                """
+            )
+            orm.save_distances(full=False, labels=True)
+            df = labels()
+            new = (df["label"] == 1).values
+            pd.testing.assert_frame_equal(
+                df.loc[new, self.settings.attributes],
+                expected.loc[new],
+                check_exact=False,
+                obj=engine,
+            )
+            self.assertTrue(
+                (df.loc[~new, self.settings.attributes] == -1).all().all()
+            )
+
+    def test_save_distances_null_value(self):
+        schema = self.settings.db.db_schema
+        for engine in ["rows", "distinct", "numpy"]:
+            settings = self.settings.copy(deep=True)
+            settings.db.distance_engine = engine
+            orm = DistanceRepository(settings=settings)
+            orm.engine.execute(
+                f"""
+                UPDATE {schema}.labels SET _computed = false;
+                UPDATE {schema}.labels SET name_l = NULL
+                WHERE _index_l = (SELECT min(_index_l) FROM {schema}.labels);
+                """
+            )
+            orm.save_distances(full=False, labels=True)
+            df = pd.read_sql(select(orm.Labels), con=orm.engine)
+            self.assertTrue(df["_computed"].all(), msg=engine)
+            # the distance of the NULL value stays NULL, yet is not pending
+            self.assertTrue(df.loc[df["name_l"].isna(), "name"].isna().all())
+            self.assertTrue(df.loc[df["name_l"].notna(), "name"].notna().all())
+
+        settings = self.settings.copy(deep=True)
+        settings.db.distance_engine = "distinct"
+        orm = DistanceRepository(settings=settings)
+        report = orm.save_distances(full=False, labels=True)
+        self.assertEqual(list(report["n_pairs"]), [0, 0])
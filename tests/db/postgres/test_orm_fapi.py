@@ -1,14 +1,19 @@
 """ integration testing postgres database initialization functions
 """
+import time
 import unittest
 
+import joblib
 import numpy as np
 import pandas as pd
 import pytest
 from faker import Faker
 from pytest import MonkeyPatch
+from sklearn.linear_model import LogisticRegression
 from tqdm import tqdm
 
+from oagdedupe._typing import (ARRAY_MEDIA_TYPE, array_from_bytes,
+                               array_to_bytes, media_type)
 from oagdedupe.db.postgres.initialize import InitializeRepository
 from oagdedupe.db.postgres.orm import FapiRepository
 
@@ -43,10 +48,32 @@ def fake_predict(self, dists):
     return [[0.1, 0.9], [0.85, 0.15]]
 
 
+def slow_predict(self, dists):
+    # later partitions finish first
+    time.sleep(0.1 * dists[0, -1])
+    return np.hstack([1 - dists[:, :1], dists[:, :1]])
+
+
+class FakeResponse:
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+def fake_post(url, data, headers):
+    assert url.endswith("/predict/array")
+    assert media_type(headers["Content-Type"]) == ARRAY_MEDIA_TYPE
+    dists = array_from_bytes(data, n_cols=2)
+    return FakeResponse(array_to_bytes(np.hstack([1 - dists, dists])))
+
+
 class TestFapiRepository(unittest.TestCase):
     @pytest.fixture(autouse=True)
-    def prepare_fixtures(self, settings, df):
+    def prepare_fixtures(self, settings, df, tmp_path):
         self.settings = settings
+        self.tmp_path = tmp_path
         self.df = df
         self.df2 = df.copy()
 
@@ -62,6 +89,26 @@ class TestFapiRepository(unittest.TestCase):
         df = self.orm.get_distances()
         self.assertEqual(len(df), 2)
 
+    def test_with_attributes(self):
+        df = self.orm.get_distances()
+        self.assertIs(self.orm.with_attributes(df), df)
+
+        settings = self.settings.copy(deep=True)
+        settings.db.normalize_comparisons = True
+        InitializeRepository(settings=settings).setup(df=self.df, df2=self.df2)
+        orm = FapiRepository(settings=settings)
+        seed_distances(orm=orm)
+        df = orm.get_distances()
+        self.assertNotIn("name_l", df.columns)
+        df = orm.with_attributes(df)
+        maindf = pd.read_sql(
+            "SELECT * FROM dedupe.df", con=orm.engine, index_col="_index"
+        )
+        self.assertEqual(
+            list(df["name_l"]), list(maindf.loc[df["_index_l"], "name"])
+        )
+        self.assertEqual(list(df["name_l"]), list(df["name_r"]))
+
     def test_get_labels(self):
         df = self.orm.get_labels()
         self.assertEqual(len(df), 14)
@@ -101,3 +148,82 @@ class TestFapiRepository(unittest.TestCase):
             self.orm.save_predictions()
         df = pd.read_sql("SELECT * FROM dedupe.scores", con=self.orm.engine)
         self.assertEqual([[0.9, 2, 2], [0.15, 1, 1]], df.values.tolist())
+
+    def test_save_predictions_local(self):
+        estimator = LogisticRegression().fit([[0.1, 0.1], [0.9, 0.9]], [0, 1])
+        settings = self.settings.copy(deep=True)
+        settings.model.scoring_engine = "local"
+        settings.model.path_model = self.tmp_path / "model"
+        joblib.dump(estimator, settings.model.path_model)
+
+        with self.monkeypatch.context() as m:
+            m.setattr(FapiRepository, "predict", None)
+            FapiRepository(settings=settings).save_predictions()
+        df = pd.read_sql("SELECT * FROM dedupe.scores", con=self.orm.engine)
+        expected = estimator.predict_proba([[0.8, 0.8], [0.2, 0.2]])[:, 1]
+        np.testing.assert_allclose(df["score"], expected)
+        self.assertEqual(
+            [[2, 2], [1, 1]], df[["_index_l", "_index_r"]].values.tolist()
+        )
+
+    def test_predict(self):
+        dists = np.array([[0.8, 0.1, 2**30, 2**30 + 1], [0.2, 0.7, 1, 1]])
+        with self.monkeypatch.context() as m:
+            m.setattr("oagdedupe.db.postgres.orm.requests.post", fake_post)
+            res = self.orm.predict(dists)
+        np.testing.assert_allclose(
+            res, np.hstack([1 - dists[:, :2], dists[:, :2]]), rtol=1e-6
+        )
+
+    def test_array_bytes(self):
+        arr = np.random.default_rng(0).random((3, 2))
+        buf = array_to_bytes(arr)
+        self.assertEqual(len(buf), 8 + 6 * 4)
+        res = array_from_bytes(buf)
+        self.assertEqual(res.dtype, np.float32)
+        np.testing.assert_allclose(res, arr, rtol=1e-6)
+        empty = array_from_bytes(array_to_bytes(arr[:0]))
+        self.assertEqual(empty.shape, (0, 2))
+
+    def test_array_bytes_invalid(self):
+        buf = array_to_bytes(np.zeros((3, 2)))
+        for invalid in [buf[:4], buf[:-4], buf + b"\0" * 4]:
+            with self.assertRaises(ValueError):
+                array_from_bytes(invalid)
+        with self.assertRaises(ValueError):
+            array_from_bytes(buf, n_cols=3)
+        self.assertEqual(
+            media_type("Application/X-Float32-Array; charset=binary"),
+            ARRAY_MEDIA_TYPE,
+        )
+
+    def test_save_predictions_pipelined(self):
+        settings = self.settings.copy(deep=True)
+        settings.db.chunksize = 1
+        settings.model.cpus = 2
+        orm = FapiRepository(settings=settings)
+        with self.monkeypatch.context() as m:
+            m.setattr(FapiRepository, "predict", slow_predict)
+            orm.save_predictions()
+        df = pd.read_sql("SELECT * FROM dedupe.scores", con=orm.engine)
+        self.assertEqual([[0.8, 2, 2], [0.2, 1, 1]], df.values.tolist())
+
+    def test_save_predictions_min_score_partitioned(self):
+        settings = self.settings.copy(deep=True)
+        settings.model.min_score = 0.5
+        settings.db.score_partitions = 4
+        orm = FapiRepository(settings=settings)
+        with self.monkeypatch.context() as m:
+            m.setattr(FapiRepository, "predict", fake_predict)
+            orm.save_predictions()
+        df = pd.read_sql("SELECT * FROM dedupe.scores", con=orm.engine)
+        self.assertEqual([[0.9, 2, 2]], df.values.tolist())
+        # scores 0.875 and up are in the last of [0.5, 0.625, 0.75, 0.875]
+        df = pd.read_sql("SELECT * FROM dedupe.scores_3", con=orm.engine)
+        self.assertEqual(len(df), 1)
+        plan = pd.read_sql(
+            "EXPLAIN SELECT * FROM dedupe.scores WHERE score > 0.8",
+            con=orm.engine,
+        )["QUERY PLAN"]
+        scanned = plan.str.extract(r"Scan on (scores_\d+)\b")[0].dropna()
+        self.assertEqual(["scores_2", "scores_3"], sorted(scanned))
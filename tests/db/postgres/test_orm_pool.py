@@ -0,0 +1,42 @@
+""" integration testing pooled engines
+"""
+import unittest
+from multiprocessing import Pool
+
+import pandas as pd
+import pytest
+
+from oagdedupe.db.postgres import pool
+
+
+def query(settings):
+    return (
+        pd.read_sql("SELECT 1 as x", con=pool.get_engine(settings))["x"][0],
+        pool.pool_stats()["connects"],
+    )
+
+
+class TestPool(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def prepare_fixtures(self, settings):
+        self.settings = settings
+
+    def test_connections_reused(self):
+        before = pool.pool_stats()
+        for _ in range(5):
+            query(self.settings)
+        after = pool.pool_stats()
+        self.assertGreaterEqual(after["checkouts"] - before["checkouts"], 5)
+        self.assertLessEqual(after["connects"] - before["connects"], 1)
+        self.assertGreaterEqual(after["reused"] - before["reused"], 4)
+
+    def test_engine_per_process(self):
+        engine = pool.get_engine(self.settings)
+        query(self.settings)
+        with Pool(2) as p:
+            res = p.map(query, [self.settings] * 4)
+        # workers start from fresh counters and their own connections
+        self.assertTrue(all(x == 1 and n <= 2 for x, n in res))
+        # the parent's pooled connection survives the workers
+        self.assertIs(pool.get_engine(self.settings), engine)
+        self.assertEqual(query(self.settings)[0], 1)
@@ -0,0 +1,141 @@
+import math
+import unittest
+from collections import Counter
+
+import numpy as np
+import pytest
+from faker import Faker
+
+from oagdedupe.distance import comparators
+
+
+def jaro_winkler(a, b):
+    """reference implementation"""
+    if not a and not b:
+        return 1.0
+    window = max(max(len(a), len(b)) // 2 - 1, 0)
+    matched_a, matched_b = [False] * len(a), [False] * len(b)
+    for i, c in enumerate(a):
+        for j in range(max(0, i - window), min(len(b), i + window + 1)):
+            if not matched_b[j] and b[j] == c:
+                matched_a[i] = matched_b[j] = True
+                break
+    m = sum(matched_a)
+    if m == 0:
+        return 0.0
+    seq_a = [c for c, x in zip(a, matched_a) if x]
+    seq_b = [c for c, x in zip(b, matched_b) if x]
+    t = sum(x != y for x, y in zip(seq_a, seq_b)) / 2
+    jaro = (m / len(a) + m / len(b) + (m - t) / m) / 3
+    prefix = 0
+    for x, y in zip(a[:4], b[:4]):
+        if x != y:
+            break
+        prefix += 1
+    return jaro + prefix * 0.1 * (1 - jaro)
+
+
+def levenshtein_ratio(a, b):
+    """reference implementation"""
+    prev = list(range(len(b) + 1))
+    for i, x in enumerate(a, 1):
+        cur = [i]
+        for j, y in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (x != y)))
+        prev = cur
+    longest = max(len(a), len(b))
+    return 1 - prev[-1] / longest if longest else 1.0
+
+
+def token_jaccard(a, b):
+    """reference implementation"""
+    sa, sb = set(a.split()), set(b.split())
+    return len(sa & sb) / len(sa | sb) if sa | sb else 1.0
+
+
+def ngram_cosine(a, b):
+    """reference implementation"""
+    ca = Counter(a[i : i + 3] for i in range(len(a) - 2))
+    cb = Counter(b[i : i + 3] for i in range(len(b) - 2))
+    if not ca or not cb:
+        return float(a == b)
+    dot = sum(ca[g] * cb[g] for g in ca)
+    norm = math.sqrt(sum(v * v for v in ca.values())) * math.sqrt(
+        sum(v * v for v in cb.values())
+    )
+    return dot / norm
+
+
+references = {
+    "jarowinkler": jaro_winkler,
+    "levenshtein": levenshtein_ratio,
+    "jaccard": token_jaccard,
+    "cosine": ngram_cosine,
+}
+
+
+@pytest.fixture(scope="module")
+def pairs():
+    fake = Faker()
+    fake.seed_instance(0)
+    a = [fake.name() for _ in range(200)] + ["", "a", "ab", "abc", "é ü"]
+    b = [fake.name() if i % 2 else x[::-1] for i, x in enumerate(a[:200])]
+    b += ["", "", "ab", "abd", "ü é"]
+    return np.array(a, dtype=object), np.array(b, dtype=object)
+
+
+class TestComparators(unittest.TestCase):
+    @pytest.fixture(autouse=True)
+    def prepare_fixtures(self, pairs):
+        self.a, self.b = pairs
+
+    def test_match_reference(self):
+        for name, reference in references.items():
+            expected = [reference(x, y) for x, y in zip(self.a, self.b)]
+            np.testing.assert_allclose(
+                comparators.COMPARATORS[name](self.a, self.b),
+                expected,
+                err_msg=name,
+            )
+
+    def test_known_values(self):
+        a = np.array(["MARTHA", "DWAYNE", "DIXON"], dtype=object)
+        b = np.array(["MARHTA", "DUANE", "DICKSONX"], dtype=object)
+        np.testing.assert_allclose(
+            comparators.jaro_winkler(a, b), [0.9611, 0.84, 0.8133], atol=1e-4
+        )
+        np.testing.assert_allclose(
+            comparators.levenshtein_ratio(
+                np.array(["kitten"], dtype=object),
+                np.array(["sitting"], dtype=object),
+            ),
+            [1 - 3 / 7],
+        )
+
+    def test_nulls(self):
+        a = np.array(["abc", None, "abc"], dtype=object)
+        b = np.array([None, "abc", "abc"], dtype=object)
+        for comparator in comparators.COMPARATORS.values():
+            res = comparator(a, b)
+            self.assertTrue(np.isnan(res[:2]).all())
+            self.assertEqual(res[2], 1)
+
+    def test_batches(self):
+        expected = comparators.jaro_winkler(self.a, self.b)
+        original = comparators.MAX_CELLS
+        comparators.MAX_CELLS = 1000
+        try:
+            np.testing.assert_allclose(
+                comparators.jaro_winkler(self.a, self.b), expected
+            )
+        finally:
+            comparators.MAX_CELLS = original
+
+    def test_length_outlier(self):
+        a = np.append(self.a, "x" * 300)
+        b = np.append(self.b, "x" * 299 + "y")
+        for name in ["jarowinkler", "levenshtein"]:
+            expected = [references[name](x, y) for x, y in zip(a, b)]
+            np.testing.assert_allclose(
+                comparators.COMPARATORS[name](a, b), expected, err_msg=name
+            )